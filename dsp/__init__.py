@@ -1,15 +1,19 @@
 from .bark import bark
 from .barkfb import barkfb
+from .cache import cache_clear, cache_info
 from .delta import delta
 from .frame_to_time import frame_to_time
+from .frame_view import frame_view
 from .invbark import invbark
 from .invmel import invmel
 from .mel import mel
 from .melfb import melfb
 from .pow_spect import pow_spect
 from .preemphasis import preemphasis
+from .rfft_frames import rfft_frames
 from .segment import segment
 from .spect import spect
 from .time_to_frame import time_to_frame
 from .wave_to_len import wave_to_len
 from .wave_to_samples import wave_to_samples
+from .window import window
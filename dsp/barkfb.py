@@ -5,13 +5,16 @@ Basic DPS library.
 import numpy as np
 import sleepat
 from sleepat import dsp
+from sleepat.dsp.cache import cached
 
+@cached(maxsize=32)
 def barkfb(fs:int, nfft:int, fmin:float, fmax:float) -> np.ndarray:
     """
     Calculates bark-frequency filter bank. The filters are trapeziodal
     in shape and have center freq. equdistantly placed on bark-freq.
     scale. The output is a matrix of weights, where each row is one
-    filter.
+    filter. The matrix is cached per parameter set and returned
+    read-only, see dsp.cache_info().
     ----------------------------------------------
     Input :
         fs ... sampling rate (default: int=16e3)
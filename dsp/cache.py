@@ -0,0 +1,47 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Basic DPS library.
+
+Process-wide cache for arrays that depend only on front-end parameters
+(filter banks, windows). Each cached function keeps its own bounded LRU
+cache keyed by its arguments. Cached arrays are returned read-only since
+all callers share the same copy.
+"""
+import functools
+import numpy as np
+
+_registry = dict()
+
+def cached(maxsize:int=32):
+    """
+    Decorator that caches the np.ndarray returned by a function in a bounded
+    LRU cache and registers the function for cache_info()/cache_clear().
+    Arguments must be hashable.
+    Input:
+        maxsize ... max. number of cached arrays per function (default:int = 32)
+    """
+    def decorator(func):
+        @functools.lru_cache(maxsize=maxsize)
+        def wrapper(*args, **kwargs):
+            out = func(*args, **kwargs)
+            out.flags.writeable = False
+            return out
+        functools.update_wrapper(wrapper, func)
+        _registry[func.__name__] = wrapper
+        return wrapper
+    return decorator
+
+def cache_info() -> dict:
+    """
+    Return cache statistics for every cached function.
+    Output:
+        dict of {function name: {'hits', 'misses', 'maxsize', 'currsize'}}
+    """
+    return {name: func.cache_info()._asdict() for name, func in _registry.items()}
+
+def cache_clear() -> None:
+    """
+    Clear caches of all cached functions.
+    """
+    for func in _registry.values():
+        func.cache_clear()
@@ -3,26 +3,37 @@ Made by Michal Borsky, 2019, copyright (C) RU
 Basic DPS library.
 """
 import numpy as np
+import scipy
+from scipy import ndimage
 
-def delta(feats:np.ndarray, delta_window:int) -> np.ndarray:
+def delta(feats:np.ndarray, delta_window:int, order:int=1, out:np.ndarray=None) -> np.ndarray:
     """
-    Calculates the delta features from an (M,N) array.
-    Edge value are repeated to maintain feature dimensions.
+    Calculates the delta features from an (M,N) array as a FIR filter along
+    the time axis. Edge value are repeated to maintain feature dimensions.
+    Higher orders can be computed in one pass by composing the delta kernel
+    with itself, which equals repeated deltas except for the first/last
+    order*delta_window frames, where edge values are repeated only once.
     Input :
         feats ... features array where M is the number of
                   observations and N is feature dimension.
         delta_window ... number of +- neighbouring frames used to compute deltas.
                     Edge points are repeated (default:int=2).
+        order ... delta order computed by a composed kernel (default:int=1)
+        out ... preallocated output, can be a view (default:np.ndarray=None)
     Output:
         feats_delta .... np.ndarray(shape=(M,N), dtype=feats.dtype)
     """
     if delta_window < 1:
         raise ValueError('Window length must be an integer >= 1')
+    if order < 1:
+        raise ValueError('Delta order must be an integer >= 1')
 
     den = 2*sum([i**2 for i in range(1, delta_window+1)])
-    feats_pad = np.pad(feats,((delta_window,delta_window),(0,0)),mode='edge')
-    feats_delta = np.zeros(shape=(feats.shape),dtype=feats.dtype)
-    weights = range(-delta_window, delta_window+1)
-    for i in range(feats.shape[0]):
-        feats_delta[i] = np.dot(weights,feats_pad[i : 2*delta_window+i+1])/den
-    return feats_delta
\ No newline at end of file
+    weights = np.arange(-delta_window, delta_window+1)/den
+    kernel = weights
+    for _ in range(1, order):
+        kernel = np.convolve(kernel, weights)
+    if out is None:
+        out = np.empty(shape=(feats.shape),dtype=feats.dtype)
+    ndimage.correlate1d(feats, kernel, axis=0, output=out, mode='nearest')
+    return out
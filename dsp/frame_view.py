@@ -0,0 +1,23 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Basic DPS library.
+"""
+import numpy as np
+
+def frame_view(x, flen:int, fstep:int) -> np.ndarray:
+    """
+    Returns overlapping frames of a signal as a strided view, no data is
+    copied. Row i of the view starts at sample i*fstep and has flen samples.
+    Incomplete frames at the end of the signal are dropped, same as in
+    dsp.segment(). The view is read-only because rows share memory.
+    Input:
+        x  .... input signal as (t,1) or (t,) numpy.ndarray
+        flen .... frame length in samples
+        fstep .... frame step in samples
+    Output:
+        frames ... read-only np.ndarray(shape=(num_of_frames,flen), dtype=x.dtype)
+    """
+    x = np.ascontiguousarray(x).reshape(-1)
+    fnum = max((len(x)-flen)//fstep + 1, 0)
+    return np.lib.stride_tricks.as_strided(x, shape=(fnum,flen),
+        strides=(fstep*x.strides[0],x.strides[0]), writeable=False)
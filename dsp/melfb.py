@@ -5,13 +5,16 @@ Basic DPS library.
 import numpy as np
 import sleepat
 from sleepat import dsp
+from sleepat.dsp.cache import cached
 
+@cached(maxsize=32)
 def melfb(mel_filts:int, fs:int, nfft:int, fmin:float, fmax:float) -> np.ndarray:
     """
     Creates mel-frequency filter bank. The filters are triangular
     in shape and have center freq. equdistantly placed on mel-freq.
     scale. The output is a matrix of weights, where each row is one
-    filter.
+    filter. The matrix is cached per parameter set and returned
+    read-only, see dsp.cache_info().
     ----------------------------------------------------------
     Input :
         M  ... number of filters (default: int=23)
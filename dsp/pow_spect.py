@@ -7,7 +7,7 @@ import sleepat
 from sleepat import dsp
 
 def pow_spect(x, fs:float, wlen:float, wstep:float, remove_dc:bool,
-    wtype:str) -> np.ndarray:
+    wtype:str, workers:int=None, block_size:int=4096) -> np.ndarray:
     """
     Computes power spectrum of a signal with segmentation.
     Input:
@@ -15,10 +15,14 @@ def pow_spect(x, fs:float, wlen:float, wstep:float, remove_dc:bool,
         fs .... sampling frequency in Hz 
         wlen .... window length in seconds 
         wstep .... window step in seconds
+        workers ... no. scipy.fft threads, None uses numpy.fft (default:int = None)
+        block_size ... no. frames transformed in one FFT call (default:int = 4096)
     Output:
         power spectrum as np.ndarray(shape=(num_of_frames,wlen),dtype=np.float32)
         that contains power spectrum
     """
-    X = dsp.spect(x,fs,wlen,wstep,remove_dc,wtype)
-    N = 1/(X.shape[0])
-    return N*(X**2).astype(np.float32)
+    frames = dsp.segment(x,fs,wlen,wstep,remove_dc,wtype)
+    nfft = np.around(wlen*fs).astype(np.uint32)
+    P = dsp.rfft_frames(frames, nfft, power=True, workers=workers, block_size=block_size)
+    P *= 1/(P.shape[0])
+    return P
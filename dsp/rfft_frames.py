@@ -0,0 +1,41 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Basic DPS library.
+"""
+import numpy as np
+import scipy
+from scipy import fft as sfft
+
+def rfft_frames(frames:np.ndarray, nfft:int, power:bool=False, workers:int=None,
+    block_size:int=4096, out:np.ndarray=None) -> np.ndarray:
+    """
+    Computes magnitude spectra of a frame matrix. Frames are transformed in
+    blocks of 'block_size' rows with one real FFT call per block, which
+    bounds the complex temporary memory. The result is written directly into
+    a float32 output. With 'workers' set, scipy.fft is used instead of
+    numpy.fft and each block is transformed with that many threads.
+    Input:
+        frames ... matrix of frames np.ndarray(shape=(num_of_frames,flen))
+        nfft ... DFT points
+        power ... return squared magnitude instead (default:bool = False)
+        workers ... no. scipy.fft threads, None uses numpy.fft (default:int = None)
+        block_size ... no. frames transformed at once (default:int = 4096)
+        out ... preallocated output, allocated if None (default:np.ndarray = None)
+    Output:
+        out ... np.ndarray(shape=(num_of_frames,nfft/2+1), dtype=np.float32)
+    """
+    nfft = int(nfft)
+    M = frames.shape[0]
+    if out is None:
+        out = np.empty(shape=(M, nfft//2 + 1), dtype=np.float32)
+
+    for beg in range(0, M, block_size):
+        end = min(beg+block_size, M)
+        if workers is None:
+            X = np.fft.rfft(frames[beg:end], nfft, axis=1)
+        else:
+            X = sfft.rfft(frames[beg:end], nfft, axis=1, workers=workers)
+        np.absolute(X, out=out[beg:end], casting='unsafe')
+        if power:
+            np.square(out[beg:end], out=out[beg:end])
+    return out
@@ -4,10 +4,16 @@ Get rid of math - it does interger rounding, replace with np routine
 """
 import numpy as np
 import math
+import sleepat
+from sleepat import dsp
 
-def segment(x, fs:float, wlen:float, wstep:float, remove_dc:bool, wtype:str) -> np.ndarray:
+def segment(x, fs:float, wlen:float, wstep:float, remove_dc:bool, wtype:str,
+    chunk_size:int=4096) -> np.ndarray:
     """
-    Segments the signal into frames and applies a window function.
+    Segments the signal into frames and applies a window function. Frames
+    are taken as a strided view of the signal (see dsp.frame_view()) and
+    windowed/DC-corrected in chunks of 'chunk_size' frames, so temporary
+    memory does not grow with signal length.
     Input:
         x  .... input signal as (t,1) numpy.ndarray
         fs .... sampling frequency (default:float = 8000)
@@ -16,26 +22,22 @@ def segment(x, fs:float, wlen:float, wstep:float, remove_dc:bool, wtype:str) ->
         wtype ... window type ("hamming"|"bartlett"|"blackman"|"hanning"|"rectangular")
             (default:str = hamming)
         remove_dc ... removes offset, done on per-segment basis (default:bool = True)
+        chunk_size ... no. frames processed at once (default:int = 4096)
     Output:
         frames ... signal frames oragnized as a matrix of shape=(num_of_frames,flen)
     """
     flen = math.ceil(wlen*fs)
     fstep = math.ceil(wstep*fs)
-    fnum = math.floor((len(x)-flen)/fstep) + 1
-    frames = np.zeros(shape=(fnum,flen),dtype=np.float32)
+    view = dsp.frame_view(x, flen, fstep)
+    fnum = view.shape[0]
+    frames = np.empty(shape=(fnum,flen),dtype=np.float32)
+    win = dsp.window(wtype, flen)
 
-    if wtype == 'rectangular':
-        win = np.ones(shape=(flen,1))
-    else:
-        window = getattr(np,wtype)
-        win = window(flen)
-
-    # Main loop
-    for i in range(fnum):
-        ii = i*fstep
-        jj = ii + flen
-        frame = x[ii:jj]*win
+    # Main loop, over chunks of frames
+    for beg in range(0, fnum, chunk_size):
+        end = min(beg+chunk_size, fnum)
+        frame = view[beg:end]*win
         if remove_dc:
-            frame -= np.mean(frame)
-        frames[i] = frame.astype(np.float32)
+            frame -= frame.mean(axis=1, keepdims=True)
+        frames[beg:end] = frame
     return frames
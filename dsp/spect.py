@@ -7,7 +7,7 @@ import sleepat
 from sleepat import dsp
 
 def spect(x, fs:float, wlen:float, wstep:float, remove_dc:bool,
-        wtype:str) -> np.ndarray:
+        wtype:str, workers:int=None, block_size:int=4096) -> np.ndarray:
     """
     Computes magnitude spectrum of a signal with segmentation
     Input:
@@ -18,14 +18,11 @@ def spect(x, fs:float, wlen:float, wstep:float, remove_dc:bool,
         remove_dc ... removes offset, done on per-segment basis (default:bool = True)
         wtype ... window type ("hamming"|"bartlett"|"blackman"|"hanning"|"rectangular")
             (default:str = hamming)
+        workers ... no. scipy.fft threads, None uses numpy.fft (default:int = None)
+        block_size ... no. frames transformed in one FFT call (default:int = 4096)
     Output:
        mag_frames ... a numpy.ndarray that contains magnitude spectra of frames
     """
     frames = dsp.segment(x,fs,wlen,wstep,remove_dc,wtype)
     nfft = np.around(wlen*fs).astype(np.uint32)
-    M = frames.shape[0]  #pylint: disable=unsubscriptable-object
-    mag_frames = np.zeros(shape=(M, np.int(nfft/2 + 1)), dtype=np.float32)
-    for i in range(M):
-        mag_frame = np.absolute(np.fft.rfft(frames[i, :], nfft))
-        mag_frames[i, :] = mag_frame.astype(np.float32)
-    return mag_frames
+    return dsp.rfft_frames(frames, nfft, workers=workers, block_size=block_size)
@@ -15,5 +15,5 @@ def wave_to_len(file:str,fs:float) -> float:
     Output:
         waveform length in seconds        
     """
-    wave = io.read_npy(file)
+    wave = io.read_npy(file, mmap=True)
     return np.round(len(wave)/fs,6)
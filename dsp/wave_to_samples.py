@@ -14,5 +14,5 @@ def wave_to_samples(file:str) -> int:
     Output
         waveform length in samples
     """
-    wave = io.read_npy(file)
+    wave = io.read_npy(file, mmap=True)
     return wave.shape[0]
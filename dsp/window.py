@@ -0,0 +1,21 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Basic DPS library.
+"""
+import numpy as np
+from sleepat.dsp.cache import cached
+
+@cached(maxsize=16)
+def window(wtype:str, flen:int) -> np.ndarray:
+    """
+    Creates a window function of a given type and length. The output is cached
+    and read-only, see dsp.cache_info().
+    Input:
+        wtype ... window type ("hamming"|"bartlett"|"blackman"|"hanning"|"rectangular")
+        flen ... window length in samples
+    Output:
+        win ... np.ndarray(shape=(flen,))
+    """
+    if wtype == 'rectangular':
+        return np.ones(shape=(flen,))
+    return getattr(np,wtype)(flen)
@@ -6,6 +6,7 @@ from .apply_mvn import apply_mvn
 from .compute_bfcc import compute_bfcc
 from .compute_c1 import compute_c1
 from .compute_fbank import compute_fbank
+from .compute_feats import compute_feats
 from .compute_mfcc import compute_mfcc
 from .compute_acf import compute_acf
 from .compute_mvn_stats import compute_mvn_stats
@@ -13,4 +14,5 @@ from .compute_spect_slope import compute_spect_slope
 from .compute_pca import compute_pca
 from .feats_to_dim import feats_to_dim
 from .feats_to_len import feats_to_len
+from .frames_to_c1 import frames_to_c1
 from .splice_frames import splice_frames
\ No newline at end of file
@@ -9,7 +9,8 @@ from sleepat import dsp, opts
 def add_delta(feats:np.ndarray, config:str=None, **kwargs) -> np.ndarray:
     """
     Adds dynamic features to feature array. Edge values are repeated
-    to maintain feature dimension. Dynamic features are concatenated
+    to maintain feature dimension. Deltas are written directly into the
+    output array. Dynamic features are concatenated
     in the ascending order along the x-axis after static features.
     Optional arguments can be passed in a config file or as kwargs.
 
@@ -17,6 +18,8 @@ def add_delta(feats:np.ndarray, config:str=None, **kwargs) -> np.ndarray:
         feats ... array of values of np.ndarray(shape=(m,n)) shape
         <delta_order> ... order of delta coefficients (default:int = 2)
         <delta_window> ... no +-context frames to delta computation (default:int = 2)
+        <delta_compose> ... compute each order from static features with a composed
+            kernel instead of chaining deltas, differs at edges (default:bool = False)
         config ... configuration file with optional arguments (default:str=None)
         **kwargs ... optional arguments passed as kwargs
 
@@ -30,6 +33,8 @@ def add_delta(feats:np.ndarray, config:str=None, **kwargs) -> np.ndarray:
     out = np.empty(shape=(m,n*(conf.delta_order+1)),dtype=feats.dtype)
     out[0:m,0:n] = feats
     for j in range(1, conf.delta_order+1):
-        dynamic = dsp.delta(out[:,n*(j-1):n*j], conf.delta_window)
-        out[0:m,n*j:n*(j+1)] = dynamic
+        if conf.delta_compose:
+            dsp.delta(feats, conf.delta_window, order=j, out=out[:,n*j:n*(j+1)])
+        else:
+            dsp.delta(out[:,n*(j-1):n*j], conf.delta_window, out=out[:,n*j:n*(j+1)])
     return out
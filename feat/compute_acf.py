@@ -3,6 +3,8 @@ Made by Michal Borsky, 2019, copyright (C) RU
 Acoustuc feature extraction library.
 """
 import numpy as np
+import scipy
+from scipy import fft as sfft
 import sleepat
 from sleepat import dsp, opts
 
@@ -20,6 +22,8 @@ def compute_acf(sig, config:str=None, **kwargs) -> np.ndarray:
         <wstep> ... window step in seconds (default: float = 0.01)
         <acorr_type> auto-correlation type (default:str = )
         <nacf> ... num. of autocorr coefficients including (default:int = 320)
+        <acf_method> ... 'direct' uses np.correlate() per frame, 'fft' computes all
+            frames at once through zero-padded FFT (default:str = 'direct')
         config ...
         **kwargs ...
     Output :
@@ -31,8 +35,49 @@ def compute_acf(sig, config:str=None, **kwargs) -> np.ndarray:
     frames = dsp.segment(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
     M = frames.shape[0]  #pylint: disable=unsubscriptable-object
     acf = np.zeros(shape=(M,conf.nacf), dtype=np.float32)
+    if conf.acf_method == 'fft':
+        return _acf_fft(frames, conf.nacf, conf.actype, out=acf)
     for i in range(M):
         acorr = np.correlate(frames[i,:], frames[i,:], mode=conf.actype)
         mid = int(acorr.shape[0]/2)
         acf[i] = acorr[mid:mid+conf.nacf]
     return acf.astype(np.float32)
+
+def _acf_fft(frames:np.ndarray, nacf:int, actype:str='same', block_size:int=4096,
+    out:np.ndarray=None) -> np.ndarray:
+    """
+    Calculates autocorrelation of all frames via the Wiener-Khinchin theorem,
+    i.e., inverse FFT of the power spectrum zero-padded to avoid circular
+    wrap-around. Returns lags 0..nacf-1, the same values as taken from
+    np.correlate(mode=actype) in compute_acf(). The 'same' mode only has
+    ceil(flen/2) non-negative lags, the 'valid' mode only lag 0.
+    Input :
+        frames ... matrix of frames np.ndarray(shape=(num_frames,flen))
+        nacf ... num. of autocorr coefficients
+        actype ... auto-correlation type ('same'|'full'|'valid') (default:str = 'same')
+        block_size ... no. frames transformed at once (default:int = 4096)
+        out ... preallocated output, allocated if None (default:np.ndarray = None)
+    Output :
+        numpy.ndarray(shape=(num_frames,nacf), dtype=numpy.float32)
+    """
+    (M, flen) = frames.shape
+    if actype == 'full':
+        max_lags = flen
+    elif actype == 'same':
+        max_lags = flen - flen//2
+    elif actype == 'valid':
+        max_lags = 1
+    else:
+        raise ValueError(f'Unsupported autocorrelation type {actype}.')
+    if nacf > max_lags:
+        raise ValueError(f'No. autocorr coefficients {nacf} > no. lags {max_lags} for {actype}.')
+    nfft = sfft.next_fast_len(2*flen - 1)
+    if out is None:
+        out = np.empty(shape=(M,nacf), dtype=np.float32)
+
+    for beg in range(0, M, block_size):
+        end = min(beg+block_size, M)
+        X = sfft.rfft(frames[beg:end].astype(np.float64), nfft, axis=1)
+        acorr = sfft.irfft(X.real**2 + X.imag**2, nfft, axis=1)
+        out[beg:end] = acorr[:,:nacf]
+    return out
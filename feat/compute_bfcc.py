@@ -20,6 +20,7 @@ def compute_bfcc(sig, config:str=None, **kwargs) -> np.ndarray:
         <preemphasis_alpha> ... pre-emphasis coefficient (default: float = 0.97)
         <wlen> ... window length in seconds (default: float = 0.25)
         <wstep> ... window step in seconds (default: float = 0.01)cd ..
+        <fft_workers> ... no. scipy.fft threads, None uses numpy.fft (default:int = None)
         <fmin> ... minimal frequency (default: float = 0)
         <fmax> ... maximum frequency (default: float = fs/2)
         <nceps> ... number of coefficients including 0th (default: int = 13)
@@ -32,7 +33,8 @@ def compute_bfcc(sig, config:str=None, **kwargs) -> np.ndarray:
     conf = opts.Bfcc(config=config, **kwargs)
     conf.nfft = np.around(conf.wlen*conf.fs).astype(np.uint16)
 
-    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
+    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype,
+        workers=conf.fft_workers)
     fbank = dsp.barkfb(conf.fs, conf.nfft, conf.fmin, conf.fmax)
     fbank_feats = np.dot(pow_frames,fbank.T)
     if conf.use_log_fbank:
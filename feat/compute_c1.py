@@ -2,31 +2,38 @@
 Made by Michal Borsky, 2019, copyright (C) RU
 Acoustuc feature extraction library.
 """
+import math
 import numpy as np
 import sleepat
-from sleepat import dsp, opts
+from sleepat import dsp, feat, opts
 
 def compute_c1(sig, config:str=None, **kwargs) -> np.ndarray:
     """
     Calculates normalized auto-correlation coefficient at unit sample delay.
-    Uses slightly different formula from [Atal76]
+    Uses slightly different formula from [Atal76]. The signal is segmented
+    chunk-wise so the full frame matrix is never held in memory. For signals
+    that do not fit into memory use objects.FeatStream('c1').
     ------------------------------------------------------------------------
     Input :
         sig ... a numpy array of values
         <fs> .... sampling frequency in Hz (default:float = 8000
         <wlen> ... window length in seconds (default:float = 0.25)
         <wstep> ... window step in seconds (default:float = 0.01)
+        <chunk_size> ... no. frames segmented at once (default:int = 4096)
         config ...
         **kwargs ...
     Output :
-        c1 ... numpy.ndarray(shape=(num_frames,1), dtype=numpy.float)
+        c1 ... numpy.ndarray(shape=(num_frames,1), dtype=numpy.float32)
     """
-    conf = opts.C1Opts(config,**kwargs)
+    conf = opts.C1(config,**kwargs)
 
-    frames = dsp.segment(sig, conf.fs, conf.wlen, conf.wstep, conf.wtype)
-    c1 = np.zeros(shape=(frames.shape[0],1))
-    for index, frame in enumerate(frames, start=0):
-        num = np.dot(frame[:-1], frame[1:])
-        den = np.sqrt(np.dot(frame[1:],frame[1:])*np.dot(frame[:-1],frame[:-1]))
-        c1[index]  = num/den
-    return c1.astype(np.float32)
+    flen = math.ceil(conf.wlen*conf.fs)
+    fstep = math.ceil(conf.wstep*conf.fs)
+    fnum = max((len(sig)-flen)//fstep + 1, 0)
+    c1 = np.empty(shape=(fnum,1), dtype=np.float32)
+    for beg in range(0, fnum, conf.chunk_size):
+        end = min(beg+conf.chunk_size, fnum)
+        frames = dsp.segment(sig[beg*fstep:(end-1)*fstep+flen], conf.fs, conf.wlen,
+            conf.wstep, conf.remove_dc, conf.wtype)
+        c1[beg:end] = feat.frames_to_c1(frames)
+    return c1
@@ -26,17 +26,18 @@ def compute_fbank(sig, config:str=None, **kwargs) -> np.ndarray:
     Output :
         fbank_feats ... numpy.ndarray(shape=(num_frames,M), dtype=numpy.float)
     """
-    conf = opts.FbankOpts(config,**kwargs)
+    conf = opts.Fbank(config,**kwargs)
 
     # Main part
     nfft = np.around(conf.wlen*conf.fs).astype(np.uint16)
     if conf.fbank_type == 'melfb':
-        fbank = melfb(conf.mel_filts, conf.fs, nfft, conf.fmin, conf.fmax)
+        fbank = dsp.melfb(conf.mel_filts, conf.fs, nfft, conf.fmin, conf.fmax)
     elif conf.fbank_type == 'barkfb':
-        fbank = barkfb(conf.fs, nfft, conf.fmin, conf.fmax)
+        fbank = dsp.barkfb(conf.fs, nfft, conf.fmin, conf.fmax)
 
     sig = dsp.preemphasis(sig, conf.preemphasis_alpha)
-    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
+    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype,
+        workers=conf.fft_workers)
     fbank_feats = np.dot(pow_frames,fbank.T)
     if conf.use_log_fbank:
         fbank_feats = np.where(fbank_feats == 0, np.finfo(float).eps, fbank_feats)  # Numerical Stability
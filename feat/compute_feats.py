@@ -0,0 +1,88 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Acoustuc feature extraction library.
+"""
+import numpy as np
+import scipy
+from scipy import fftpack
+import sleepat
+from sleepat import dsp, opts
+
+def compute_feats(sig, feat_types:list, config:str=None, **kwargs) -> dict:
+    """
+    Calculates several spectral features of one signal in a single front-end
+    pass. The signal is preemphasised, segmented and transformed to a power
+    spectrum once, filter bank projections are done once per filter bank and
+    the DCT is applied on top of shared log filter bank energies. Outputs are
+    identical to the respective compute_*() functions. Front ends are shared
+    only between features with identical front-end options, i.e., 'bfcc' is
+    computed without preemphasis, same as in compute_bfcc(). Options are
+    loaded for each feature type from the same config/kwargs.
+    -------------------------------------------------------------------------
+    Input :
+        sig ... a numpy array of values
+        feat_types ... list of features to compute ('mfcc'|'bfcc'|'fbank')
+        config ... config file to load optional arguments (default:str = None)
+        **kwargs ... optional arguments, see compute_mfcc(), compute_bfcc(),
+            compute_fbank()
+    Output :
+        feats ... dict of {feat_type: numpy.ndarray(shape=(num_frames,dim))}
+    """
+    spectra, fbanks, feats = dict(), dict(), dict()
+    for feat_type in feat_types:
+        if feat_type == 'mfcc':
+            conf = opts.Mfcc(config,**kwargs)
+            (fbank_type, preemph) = ('melfb', True)
+        elif feat_type == 'bfcc':
+            conf = opts.Bfcc(config,**kwargs)
+            (fbank_type, preemph) = ('barkfb', False)
+        elif feat_type == 'fbank':
+            conf = opts.Fbank(config,**kwargs)
+            (fbank_type, preemph) = (conf.fbank_type, True)
+        else:
+            raise ValueError(f'Unsupported feature type {feat_type}.')
+
+        # Shared power spectrum
+        alpha = conf.preemphasis_alpha if preemph else None
+        spect_key = (alpha, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
+        if spect_key not in spectra:
+            x = sig if alpha is None else dsp.preemphasis(sig, alpha)
+            spectra[spect_key] = dsp.pow_spect(x, conf.fs, conf.wlen, conf.wstep,
+                conf.remove_dc, conf.wtype, workers=conf.fft_workers)
+        pow_frames = spectra[spect_key]
+
+        # Shared filter bank energies
+        nfft = np.around(conf.wlen*conf.fs).astype(np.uint16)
+        if fbank_type == 'melfb':
+            fb_key = (fbank_type, conf.mel_filts, conf.fs, nfft, conf.fmin, conf.fmax)
+        else:
+            fb_key = (fbank_type, conf.fs, nfft, conf.fmin, conf.fmax)
+        fbank_key = (spect_key, fb_key, conf.use_log_fbank, feat_type == 'bfcc')
+        if fbank_key not in fbanks:
+            fbanks[fbank_key] = _fbank_feats(pow_frames, fb_key, conf.use_log_fbank,
+                feat_type == 'bfcc')
+        fbank_feats = fbanks[fbank_key]
+
+        if feat_type == 'fbank':
+            feats[feat_type] = fbank_feats.astype(np.float32)
+        else:
+            ceps = fftpack.dct(fbank_feats, type=2, axis=1, norm='ortho')
+            feats[feat_type] = ceps[:,:conf.nceps].astype(np.float32)
+    return feats
+
+def _fbank_feats(pow_frames:np.ndarray, fb_key:tuple, use_log:bool, bark_log:bool) -> np.ndarray:
+    """
+    Project power spectrum onto a filter bank and optionally take log. The
+    log flooring differs between compute_bfcc() and compute_mfcc()/compute_fbank(),
+    'bark_log' selects the compute_bfcc() variant.
+    """
+    if fb_key[0] == 'melfb':
+        fbank = dsp.melfb(*fb_key[1:])
+    else:
+        fbank = dsp.barkfb(*fb_key[1:])
+    fbank_feats = np.dot(pow_frames,fbank.T)
+    if use_log:
+        if not bark_log:
+            fbank_feats = np.where(fbank_feats == 0, np.finfo(float).eps, fbank_feats)
+        fbank_feats = 10*np.log10(fbank_feats + np.finfo(float).eps)
+    return fbank_feats
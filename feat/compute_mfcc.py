@@ -20,6 +20,7 @@ def compute_mfcc(sig, config:str=None, **kwargs) -> np.ndarray:
         <preemphasis_alpha> ... pre-emphasis coefficient (default: float = 0.97)
         <wlen> ... window length in seconds (default: float = 0.25)
         <wstep> ... window step in seconds (default: float = 0.01)
+        <fft_workers> ... no. scipy.fft threads, None uses numpy.fft (default:int = None)
         <mel_filts>  .... number of filters (default: int = 22)
         <fmin> ... minimal frequency (default: float = 0)
         <fmax> ... maximum frequency (default: float = fs/2)
@@ -34,7 +35,8 @@ def compute_mfcc(sig, config:str=None, **kwargs) -> np.ndarray:
     nfft = np.around(conf.wlen*conf.fs).astype(np.uint16)
     melfb = dsp.melfb(conf.mel_filts, conf.fs, nfft, conf.fmin, conf.fmax)
     sig = dsp.preemphasis(sig, conf.preemphasis_alpha)
-    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
+    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype,
+        workers=conf.fft_workers)
     fbanks = np.dot(pow_frames,melfb.T)
     if conf.use_log_fbank:
         fbanks = np.where(fbanks == 0, np.finfo(float).eps, fbanks)  # Numerical Stability
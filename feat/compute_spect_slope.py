@@ -6,7 +6,7 @@ import numpy as np
 import sleepat
 from sleepat import dsp, opts
 
-def compute_spect_slope(sig, config:str=None, **kwargs) -> np.ndarray:
+def compute_spect_slope(sig, config:str=None, block_size:int=4096, **kwargs) -> np.ndarray:
     """
     Calculates the exponential spectral decay in freq. bands.
     ----------------------------------------------------------
@@ -18,19 +18,29 @@ def compute_spect_slope(sig, config:str=None, **kwargs) -> np.ndarray:
         <wlen> ... window length in ms (def:float = 0.25)
         <wstep> ... window step in ms (def:float = 0.01)
         config ...
+        block_size ... no. frames projected onto the band slopes at once (def:int = 4096)
         **kwargs ...
     Output :
         spect_slope ... numpy.ndarray(shape=(num_frames,num_bands))
     """
-    conf = opts.SpectSlopeOpts(config,**kwargs)
+    conf = opts.SpectSlope(config,**kwargs)
 
-    bins = np.round(conf.ss_bands*conf.wlen)
-    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype)
+    bins = np.round(np.array(conf.ss_bands, dtype=float).reshape(-1,2)*conf.wlen).astype(int)
+    pow_frames = dsp.pow_spect(sig, conf.fs, conf.wlen, conf.wstep, conf.remove_dc, conf.wtype,
+        workers=conf.fft_workers)
     log_frames = 10*np.log10(pow_frames + np.finfo(float).eps)
-    spect_slope = np.zeros(shape=(pow_frames.shape[0],bins.shape[0]))
-    for i in range(log_frames.shape[0]):
-        for j in range(bins.shape[0]):
-            y = log_frames[i,int(bins[j,0]):int(bins[j,1])]
-            x = range(y.size)
-            spect_slope[i,j] = np.polyfit(x, y, deg = 1)[0]
-    return spect_slope.astype(np.float32)
+
+    # Least-squares slope of each band as a linear combination of its bins
+    weights = np.zeros(shape=(log_frames.shape[1],bins.shape[0]))
+    for j, (beg, end) in enumerate(bins):
+        x = np.arange(min(end,log_frames.shape[1]) - beg, dtype=float)
+        if x.size < 2:
+            raise ValueError(f'Band {conf.ss_bands[j]} Hz spans less than 2 frequency bins.')
+        x -= x.mean()
+        weights[beg:beg+x.size,j] = x/np.dot(x,x)
+
+    spect_slope = np.empty(shape=(log_frames.shape[0],bins.shape[0]), dtype=np.float32)
+    for beg in range(0, log_frames.shape[0], block_size):
+        end = min(beg+block_size, log_frames.shape[0])
+        spect_slope[beg:end] = np.dot(log_frames[beg:end].astype(np.float64), weights)
+    return spect_slope
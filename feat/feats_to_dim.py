@@ -16,5 +16,5 @@ def feats_to_dim(feats_scp:dict) -> tuple:
         tuple containing (utterance_id, feature dimensions)
     """
     for utt_id, fid in feats_scp.items():
-        feats = io.read_npy(fid)
+        feats = io.read_npy(fid, mmap=True)
         yield (utt_id, feats.shape[1:])
@@ -15,6 +15,6 @@ def feats_to_len(feats_scp:dict) -> tuple:
         tuple containing (utterance_id, no. features)
     """
     for utt_id, fid in feats_scp.items():
-        feats = io.read_npy(fid)
+        feats = io.read_npy(fid, mmap=True)
         yield (utt_id, feats.shape[0])
 
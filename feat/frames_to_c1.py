@@ -0,0 +1,22 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Acoustuc feature extraction library.
+"""
+import numpy as np
+
+def frames_to_c1(frames:np.ndarray) -> np.ndarray:
+    """
+    Calculates normalized auto-correlation coefficient at unit sample delay
+    for a matrix of frames. The numerator and both energies are computed for
+    all frames at once in float32. Used by compute_c1() and objects.FeatStream.
+    Input :
+        frames ... matrix of frames np.ndarray(shape=(num_frames,flen))
+    Output :
+        c1 ... numpy.ndarray(shape=(num_frames,1), dtype=numpy.float32)
+    """
+    frames = frames.astype(np.float32, copy=False)
+    num = np.einsum('ij,ij->i', frames[:,:-1], frames[:,1:])
+    den = np.einsum('ij,ij->i', frames[:,1:], frames[:,1:])
+    den *= np.einsum('ij,ij->i', frames[:,:-1], frames[:,:-1])
+    np.sqrt(den, out=den)
+    return (num/den).reshape(-1,1)
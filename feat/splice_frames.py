@@ -6,18 +6,26 @@ import numpy as np
 import sleepat
 from sleepat import opts
 
-def splice_frames(feats, config:str=None, **kwargs) -> np.ndarray:
+def splice_frames(feats, config:str=None, out:np.ndarray=None, **kwargs) -> np.ndarray:
     """
     Splice neighbouring frames as new coefficients to current frame.
     The spliced features are added to the original vector in the
     following order [left,orig,right]. An alternative to adding delta
     features. Optional arguments <> can be defined in a config file
-    or as kwargs.
+    or as kwargs. A spliced row is a flattened window of consecutive
+    (padded) frames, so the result is built as a strided view of the
+    padded features and copied in one go. With <splice_view> the view
+    itself is returned, which is read-only and costs no extra memory
+    in 'empty' mode and only the padding in other modes.
     Input :
         feats ... a feature vector of np.ndarray(shape=(N,M)) type.
         <splice_left> ... number of left frames to splice (default: int= <4>)
         <splice_right> ... number of right frames to splice (default: int= <4>)
+        <splice_mode> ... np.pad() mode for edges, 'empty' drops edge frames
+            (default:str = 'edge')
+        <splice_view> ... return a read-only strided view (default:bool = False)
         config ... configuration files with optional arguments (default:str = None)
+        out ... preallocated output to fill, (default:np.ndarray = None)
         **kwargs ... optional arguments as kwargs
     Output:
         np.ndarray(shape=(N, M*(left+right+1)))
@@ -30,16 +38,18 @@ def splice_frames(feats, config:str=None, **kwargs) -> np.ndarray:
         print(f'Error: Left + Right context >= to feature size({M}).')
         exit(1)
 
-    feats_left = np.empty(shape=(M,N*conf.splice_left), dtype=feats.dtype)
-    feats_right = np.empty(shape=(M,N*conf.splice_right), dtype=feats.dtype)
-    feats_padded = np.pad(feats,((conf.splice_left, conf.splice_right),(0,0)),mode=conf.splice_mode)
-    for m in range(M):
-        (i,j,k) = (m, m+conf.splice_left, m+conf.splice_left+conf.splice_right)
-        feats_left[i] = feats_padded[i:j].flatten()
-        feats_right[i] = feats_padded[j+1:k+1].flatten()
-
+    context = 1 + conf.splice_left + conf.splice_right
     if conf.splice_mode == 'empty':
-        (i,j) = (conf.splice_left, M-conf.splice_right)
-        return np.concatenate((feats_left[i:j],feats[i:j],feats_right[i:j]),axis=1)
+        feats_padded = np.ascontiguousarray(feats)
     else:
-        return np.concatenate((feats_left,feats,feats_right),axis=1)
+        feats_padded = np.pad(feats,((conf.splice_left, conf.splice_right),(0,0)),mode=conf.splice_mode)
+    rows = feats_padded.shape[0] - context + 1
+    spliced = np.lib.stride_tricks.as_strided(feats_padded, shape=(rows, N*context),
+        strides=(feats_padded.strides[0], feats_padded.strides[1]), writeable=False)
+
+    if out is not None:
+        np.copyto(out, spliced)
+        return out
+    if conf.splice_view:
+        return spliced
+    return spliced.copy()
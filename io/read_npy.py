@@ -6,13 +6,17 @@ import os
 from os import path
 import numpy as np
 
-def read_npy(file:str) -> np.ndarray:
+def read_npy(file:str, mmap:bool=False) -> np.ndarray:
     """
-    Reads a data from an npy file.
+    Reads a data from an npy file. With mmap, the file is opened memory-mapped
+    read-only, nothing is read until the array is accessed and then only the
+    pages covering the accessed part, e.g., a slice, are read. Use it to take
+    short segments of long recordings or to check shapes.
     Input:
         file ... string or a list of files to load
+        mmap ... open the file memory-mapped (default:bool = False)
     Output:
-        numpy array
+        numpy array, np.memmap with mmap
     """
     if not isinstance(file,str):
         print(f'Error read_npy(): file arg. expects string, got {type(file)}.')
@@ -20,4 +24,4 @@ def read_npy(file:str) -> np.ndarray:
     if not path.isfile(file):
         print(f'Error read_npy(): file {file} not found.')
         exit(1)
-    return np.load(file)
+    return np.load(file, mmap_mode='r' if mmap else None)
@@ -0,0 +1,78 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+
+A batch sampler that groups sequences of similar length, so padding
+within a batch of variable-length sequences is minimal.
+"""
+import numpy as np
+import torch
+from torch.utils import data
+
+class BucketSampler(data.Sampler):
+    """
+    Length-bucketed batch sampler for PyTorch DataLoader, pass it as the
+    'batch_sampler' argument. Indices are split into buckets of
+    'bucket_size' batches, sorted by length within a bucket and cut into
+    batches. With shuffle, the indices are shuffled before bucketing and the
+    batches are shuffled afterwards, so every epoch sees different batches
+    that still consist of sequences of similar length.
+
+    Use:
+        sampler = BucketSampler(lengths, batch_size=16, shuffle=True)
+        loader = DataLoader(dataset, batch_sampler=sampler, collate_fn=...)
+    """
+
+    def __init__(self, lengths, batch_size:int=1, shuffle:bool=False,
+        drop_last:bool=False, bucket_size:int=100, generator=None):
+        """
+        Arguments:
+            lengths ... length of every sequence in the dataset
+            batch_size ... no. sequences in a batch (def:int = 1)
+            shuffle ... whether to shuffle sequences and batches (def:bool = False)
+            drop_last ... drop last incomplete batch of every bucket (def:bool = False)
+            bucket_size ... no. batches in a bucket (def:int = 100)
+            generator ... torch.Generator used for shuffling (def = None)
+        """
+        if batch_size < 1 or bucket_size < 1:
+            raise ValueError('Batch and bucket size must be positive integers.')
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.bucket_size = bucket_size
+        self.generator = generator
+
+    def __iter__(self):
+        """
+        Yield batches as lists of dataset indices.
+        """
+        if self.shuffle:
+            order = torch.randperm(len(self.lengths), generator=self.generator).numpy()
+        else:
+            order = np.arange(len(self.lengths))
+
+        batches = list()
+        pool = self.batch_size*self.bucket_size
+        for beg in range(0, len(order), pool):
+            bucket = order[beg:beg+pool]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            for i in range(0, len(bucket), self.batch_size):
+                batch = bucket[i:i+self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+
+        if self.shuffle:
+            for i in torch.randperm(len(batches), generator=self.generator).tolist():
+                yield batches[i]
+        else:
+            yield from batches
+
+    def __len__(self):
+        """
+        Return no. batches per epoch.
+        """
+        pool = self.batch_size*self.bucket_size
+        (full, rest) = divmod(len(self.lengths), pool)
+        if self.drop_last:
+            return full*self.bucket_size + rest//self.batch_size
+        return full*self.bucket_size + -(-rest//self.batch_size)
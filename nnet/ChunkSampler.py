@@ -0,0 +1,79 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+
+A batch sampler for truncated back-propagation through time. Long
+sequences are cut into fixed-length chunks that are processed in
+parallel lanes, consecutive chunks of a sequence stay in the same lane.
+"""
+import math
+import numpy as np
+import torch
+from torch.utils import data
+
+class ChunkSampler(data.Sampler):
+    """
+    Chunked batch sampler for PyTorch DataLoader, pass it as the 'batch_sampler'
+    argument. Every sequence is cut into chunks of 'seq_len' frames. Sequences
+    are assigned to 'lanes' lanes, always to the lane with the least chunks so far, and a lane processes
+    chunks of its sequences one after another. The n-th batch holds the n-th
+    chunk of every lane that still has one, so a model can carry the hidden
+    state of a lane from one batch to the next.
+
+    A batch is a list of (lane, idx, beg, reset) tuples, where idx is a dataset
+    index, beg is the first frame of the chunk, and reset marks the chunk after
+    which the lane state must not be carried, i.e., the first chunk of every
+    sequence. This is truncated back-propagation through time.
+
+    With 'warmup' > 0, the sampler switches to a different regime, windowed
+    training without carried state. Consecutive chunks share 'warmup' frames,
+    every chunk resets and the shared frames are only context for the window.
+    """
+
+    def __init__(self, lengths, lanes:int=1, seq_len:int=100, warmup:int=0,
+        shuffle:bool=False, generator=None):
+        """
+        Arguments:
+            lengths ... length of every sequence in the dataset
+            lanes ... no. parallel lanes, i.e., batch size (def:int = 1)
+            seq_len ... no. frames in a chunk (def:int = 100)
+            warmup ... no. frames shared by consecutive chunks, > 0 turns off
+                carrying of state, see above (def:int = 0)
+            shuffle ... whether to shuffle order of sequences (def:bool = False)
+            generator ... torch.Generator used for shuffling (def = None)
+        """
+        if lanes < 1 or seq_len < 1:
+            raise ValueError('No. lanes and chunk length must be positive integers.')
+        if warmup < 0 or warmup >= seq_len:
+            raise ValueError('Chunk warm-up must be in <0,seq_len) range.')
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.lanes = lanes
+        self.seq_len = seq_len
+        self.warmup = warmup
+        self.shuffle = shuffle
+        self.generator = generator
+
+    def chunks(self, length:int) -> list:
+        """
+        Return first frames of all chunks of a sequence.
+        """
+        step = self.seq_len - self.warmup
+        num = 1 + max(0, math.ceil((length - self.seq_len)/step))
+        return [i*step for i in range(num)] if length > 0 else []
+
+    def __iter__(self):
+        """
+        Yield batches as lists of (lane, idx, beg, reset) tuples.
+        """
+        if self.shuffle:
+            order = torch.randperm(len(self.lengths), generator=self.generator).tolist()
+        else:
+            order = range(len(self.lengths))
+
+        queues = [list() for _ in range(self.lanes)]
+        for idx in order:
+            lane = min(range(self.lanes), key=lambda i: len(queues[i]))
+            for i, beg in enumerate(self.chunks(self.lengths[idx])):
+                queues[lane].append((lane, idx, beg, i == 0 or self.warmup > 0))
+
+        for step in range(max(len(queue) for queue in queues)):
+            yield [queue[step] for queue in queues if step < len(queue)]
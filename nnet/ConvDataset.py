@@ -1,7 +1,7 @@
 """
 Made by Michal Borsky, 2019, copyright (C) RU
 
-Transforms prepared data into a PyTorch-native dataset. A dataset consists of 
+Transforms prepared data into a PyTorch-native dataset. A dataset consists of
 features, targets, spk2utt, utt2spk, mvn.scp, and optionally configuration
 for feature processing. Feature processing happens during item fetching.
 Every Dataset class contains .to_dataloader() routine to convert in to
@@ -14,18 +14,27 @@ import torch
 from torch.utils import data
 import sleepat
 from sleepat import feat, io, opts, utils
+from sleepat.nnet.SampleStore import SampleStore
+from sleepat.nnet.to_shared import to_shared
+from sleepat.nnet.worker_init import worker_init
 
 class ConvDataset(data.Dataset):
     """
     Convolution dataset for PyTorch. The input is a data directory that contains
     feats.scp,targets.scp,spk2utt,utt2spk. All data is loaded to memory, so
-    not suitable for very large datasets.
+    not suitable for very large datasets, unless <use_store> is set and the
+    processed data is kept in a memory-mapped nnet.SampleStore instead.
 
     The output is a dictionary with "sample" and "target" keys. The sample is
-    a tensor (BS,CS,FD)-dimension, where BS is batch size, CS is context size,
+    a tensor (BS,1,CS,FD)-dimension, where BS is batch size, CS is context size,
     and FD is feature dimension. Target has (BS,) dimensionality. The class is
     suitable for a CNN architecture with 2D convolution layer. The dataset will
     likely be used with DataLoader, which adds batching and other functionality.
+
+    Features of all utterances are stored once, one after another, and a sample
+    is a window of consecutive frames around a center frame. The frame index is
+    compact: self.sample_rows holds the global center frame of every sample and
+    self.utt_beg the global first frame of every utterance, see index_to_utt().
     """
     def __init__(self, data_dir:str, config:str=None, **kwargs):
         """
@@ -35,10 +44,10 @@ class ConvDataset(data.Dataset):
 
         Arguments:
         data_dir ... directory with feats.scp,targets.scp,spk2utt,utt2spk
+        <mode> ... usage mode ('train'|'eval'|'infer'), 'infer' mode
+            doesn't ask for 'targets.scp'  (def:str = 'infer')
         <context_left> ... frames to left for conv. layer input (def:int = 4)
         <context_right> ... frames to right for conv. layer input (def:int = 4)
-        <apply_lda> ... whether to apply LDA (def:bool = True)
-            <lda_dim> ... LDA output dimensionality (def:int = 40)
         <add_delta> ... whether to add dynamic coefficients (def:bool = True)
             <delta_window> ... no +-context frames to delta computation (def:int = 2)
             <delta_order> ... order of delta coefficients (def:int = 2)
@@ -46,23 +55,55 @@ class ConvDataset(data.Dataset):
             <norm_vars> ... whether to normaliza variances (def: bool=False)
         <apply_mvn> ... whethet to apply mean and variance normalization (def: bool=True)
             <norm_vars> ... whether to normaliza variances (def: bool=False)
+        <use_store> ... keep processed feats/targets in a memory-mapped store,
+            rebuilt only when inputs change, see nnet.SampleStore (def:bool = False)
+            <store_dir> ... store directory, None is data_dir/store_ConvDataset
+                (def:str = None)
         <<DataLoader args>> ... see torch.utils.data.DataLoader for args.
         config ... a configuration JSON file to specify all above
         **kwargs ... setting all above through kwargs
         """
-        self.conf = opts.ConvDatasetOpts(config,**kwargs)
-        self.conf_DL = opts.PyClassOpts(data.DataLoader,config,**kwargs)
+        utils.validate_data(data_dir, no_feats=False)
+        self.conf = opts.ConvDataset(config,**kwargs)
+        self.conf_dl = opts.PyClass(data.DataLoader,config,**kwargs)
         self.feats_scp = io.read_scp(path.join(data_dir,'feats.scp'))
-        self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
         self.mvn_scp = io.read_scp(path.join(data_dir,'mvn.scp'))
         self.spk2utt = io.read_scp(path.join(data_dir,'spk2utt'))
         self.utt2spk = io.read_scp(path.join(data_dir,'utt2spk'))
+        if self.conf.mode != 'infer':
+            self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
 
+        self.shared = dict()
+        self.store = self.make_store(data_dir) if self.conf.use_store else None
+        if self.store is not None and self.store.is_built():
+            self.load_store()
+            return
         self.make_meta()
-        self.set_sample_size()
         self.set_sample_dim()
-        self.set_targets_dim()
+        if self.conf.mode != 'infer':
+            self.set_target_dim()
         self.make_examples()
+        if self.store is not None:
+            self.save_store()
+
+    def __getstate__(self):
+        """
+        Arrays from the store or in shared memory are not pickled by value, e.g.,
+        when sent to DataLoader workers. Stored arrays are opened again from the
+        store, shared arrays are passed as shared tensors, see share_memory().
+        """
+        state = self.__dict__.copy()
+        if self.store is not None or self.shared:
+            for name in ('feats', 'targets', 'sample_rows'):
+                state.pop(name, None)
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        if self.store is not None:
+            self.load_store()
+        elif self.shared:
+            self.load_shared()
 
     def __len__(self):
         """
@@ -70,53 +111,74 @@ class ConvDataset(data.Dataset):
         """
         return self.sample_size
 
-    def __getitem__(self, idx):
+    def __getitem__(self, idx:int):
         """
-        Return data and target. The output is a tensor (1,21,FD)-dimension,
-        where 1 is channel, 21 is temporal context, and FD is feature dimension.
+        Return data and target. The sample is a tensor (1,CS,FD)-dimension,
+        where 1 is channel, CS is temporal context, and FD is feature dimension.
         Uses as_tensor() so data is not copied, might be safer to use tensor().
         """
-        frame_idx = self.meta[idx]['sample_idx']
-        sample = self.feats[frame_idx-self.conf.context_left:
-            frame_idx+self.conf.context_right+1]
-        return {"targets": torch.as_tensor(self.targets[frame_idx]),
-            "sample": torch.as_tensor(sample)}
+        frame_idx = self.sample_rows[idx]
+        sample = torch.as_tensor(self.feats[frame_idx-self.conf.context_left:
+            frame_idx+self.conf.context_right+1][None])
+        if self.conf.mode == 'eval' or self.conf.mode == 'train':
+            return {"index":idx, "target":torch.as_tensor(self.targets[frame_idx]),
+                "sample":sample}
+        else:
+            return {"index":idx, "sample":sample}
 
     def make_meta(self):
         """
-        Create a metafile with dataset- and frame-wise indexing,
-        needed for __getitem__()
+        Create a compact frame index needed for __getitem__(). Per utterance,
+        self.utt_beg holds its first global frame and self.sample_beg its first
+        sample. A sample is every frame with full context inside its utterance,
+        self.sample_rows holds its global frame. Indices define a half-open
+        Pythonic interval <beg,end), the last item holds the totals.
         """
-        self.meta = dict()
-
-        db_idx = 0
-        frames_num = 0
-        for utt_id, flen in utils.feats_to_len(self.targets_scp):
-            for frame_idx in range(self.conf.context_left, flen - self.conf.context_right):
-                self.meta[db_idx] = {'sample_idx': frame_idx+frames_num,'utt_frame':frame_idx, 'utt_id': utt_id}
-                db_idx += 1
-            frames_num += flen
+        (left, right) = (self.conf.context_left, self.conf.context_right)
+        self.utt_ids = list(self.utt2spk.keys())
+        utt_pos = {utt_id:i for i, utt_id in enumerate(self.utt_ids)}
+        utt_len = np.zeros(shape=(len(self.utt_ids),), dtype=np.int64)
+        for utt_id, flen in feat.feats_to_len(self.feats_scp):
+            if utt_id in utt_pos:
+                utt_len[utt_pos[utt_id]] = flen
 
-        if db_idx == 0:
-            print('SimpleDataset.make_meta(): No samples in your dataset, (empty feats.scp?)')
+        self.utt_beg = np.zeros(shape=(len(self.utt_ids)+1,), dtype=np.int64)
+        self.sample_beg = np.zeros(shape=(len(self.utt_ids)+1,), dtype=np.int64)
+        np.cumsum(utt_len, out=self.utt_beg[1:])
+        np.cumsum(np.maximum(utt_len-left-right, 0), out=self.sample_beg[1:])
+        self.sample_size = int(self.sample_beg[-1])
+        if self.sample_size == 0:
+            print('ConvDataset.make_meta(): No samples in your dataset, (empty feats.scp?)')
             exit(1)
+        self.make_sample_rows()
 
-    def set_sample_size(self):
+    def make_sample_rows(self):
         """
-        Set total number of samples across all features files.
+        Set self.sample_rows, the global center frame of every sample, i.e.,
+        offset within its utterance plus the utterance start.
         """
-        if not hasattr(self,'meta'):
-            self.make_meta()
-        self.sample_size = len(self.meta)
+        utt_idx = np.repeat(np.arange(len(self.utt_ids)), np.diff(self.sample_beg))
+        self.sample_rows = np.arange(self.sample_size, dtype=np.int64)
+        self.sample_rows += (self.utt_beg[:-1] + self.conf.context_left
+            - self.sample_beg[:-1])[utt_idx]
 
-    def set_targets_dim(self):
+    def index_to_utt(self, idx:int) -> tuple:
+        """
+        Return (utt_id, utt_frame) of a sample, utt_frame is the center frame
+        within the utterance. The utterance is found by binary search.
+        """
+        utt_idx = int(np.searchsorted(self.sample_beg, idx, side='right')) - 1
+        return (self.utt_ids[utt_idx], int(self.sample_rows[idx] - self.utt_beg[utt_idx]))
+
+    def set_target_dim(self):
         """
         Set targets dimension.
         """
         if len(self.targets_scp) == 0:
-            print('SimpleDataset.set_targets_dim(): No targets for your dataset, (empty targets.scp?)')
+            print('ConvDataset.set_target_dim(): No targets for your dataset, (empty targets.scp?)')
             exit(1)
-        self.targets_dim = utils.feats_to_dim(self.targets_scp)
+        (_,n) = next(feat.feats_to_dim(self.targets_scp))
+        self.target_dim = n
 
     def set_sample_dim(self):
         """
@@ -124,54 +186,129 @@ class ConvDataset(data.Dataset):
         We assume the features are 2D.
         """
         if len(self.feats_scp) == 0:
-            print('SimpleDataset.set_sample_dim(): No samples in your dataset, (empty feats.scp?)')
+            print('ConvDataset.set_sample_dim(): No samples in your dataset, (empty feats.scp?)')
+            exit(1)
+        (_,m) = next(feat.feats_to_dim(self.feats_scp))
+        if len(m) > 1:
+            print(f'Error: features are expected as 2D arrays, not tensors.')
             exit(1)
-        m = utils.feats_to_dim(self.feats_scp)[0]
+        m = m[0]
         n = 1+self.conf.context_left+self.conf.context_right
 
         if self.conf.add_delta:
             m *= (1+self.conf.delta_order)
-        if self.conf.apply_lda:
-            m = self.conf.lda_dim
+        self.feats_dim = (m,)
         self.sample_dim = (m,n)
 
     def make_examples(self):
         """
         Create training examples. Everything is loaded into memory and
-        correctly indexed by self.meta.
-        """
-        if not hasattr(self,'meta'):
-            self.make_meta()
-        if not hasattr(self,'sample_size'):
-            self.set_sample_size()
-        if not hasattr(self,'feats_dim'):
-            self.set_feats_dim()
-
-        total = (self.sample_size + (self.conf.context_left
-            + self.conf.context_right)*len(self.utt2spk),)
-        self.targets = np.empty(shape = total + self.targets_dim, dtype=np.float32)
-        self.feats = np.empty(shape= total + self.feats_dim, dtype=np.float32)
-
-        beg = 0
-        for utt_id, spk_id in self.utt2spk.items():
+        correctly indexed by self.utt_beg.
+        """
+        total = (int(self.utt_beg[-1]),)
+        self.feats = self.alloc('feats', total + self.feats_dim, np.float32)
+        if self.conf.mode != 'infer':
+            self.targets = self.alloc('targets', total + self.target_dim, np.int32)
+
+        for utt_idx, utt_id in enumerate(self.utt_ids):
+            (beg, end) = (self.utt_beg[utt_idx], self.utt_beg[utt_idx+1])
             feats = io.read_npy(self.feats_scp[utt_id])
-            targets = io.read_npy(self.targets_scp[utt_id])
-            if feats.shape[0] !=  targets.shape[0]:
-                print(f'SimpleDataset.make_examples(): No. feats does not match no. targets for {utt_id}.')
-                exit(1)
+            self.feats[beg:end] = self.process_feats(feats, self.utt2spk[utt_id])
+            if self.conf.mode != 'infer':
+                targets = io.read_npy(self.targets_scp[utt_id])
+                if feats.shape[0] !=  targets.shape[0]:
+                    print(f'ConvDataset.make_examples(): No. feats does not match no. targets for {utt_id}.')
+                    exit(1)
+                self.targets[beg:end] = targets
+
+    def alloc(self, name:str, shape:tuple, dtype) -> np.ndarray:
+        """
+        Allocate an array in memory, or in the store if <use_store>.
+        """
+        if self.store is not None:
+            return self.store.create(name, shape, dtype)
+        return np.empty(shape=shape, dtype=dtype)
 
-            end = beg + feats.shape[0]
-            feats = self.process_feats(feats, spk_id)
-            self.feats[beg:end] = feats
-            self.targets[beg:end] = targets
-            beg = end
+    def make_store(self, data_dir:str) -> SampleStore:
+        """
+        Open the sample store, its fingerprint covers dataset options that change
+        the stored arrays and all input files.
+        """
+        store_dir = self.conf.store_dir
+        if store_dir is None:
+            store_dir = path.join(data_dir, 'store_ConvDataset')
+        scps = [self.feats_scp, self.mvn_scp]
+        if self.conf.mode != 'infer':
+            scps.append(self.targets_scp)
+        conf = SampleStore.sample_opts(self.conf, ('mode','context_left','context_right','apply_mvn','apply_mvs','add_delta'))
+        conf['utts'] = list(self.utt2spk.items())
+        return SampleStore(store_dir, SampleStore.make_fingerprint(conf, scps))
+
+    def save_store(self):
+        """
+        Commit the store with everything needed by load_store(). The frame index
+        is small and kept in the manifest.
+        """
+        meta = {'utt_ids':self.utt_ids, 'utt_beg':self.utt_beg.tolist(),
+            'sample_beg':self.sample_beg.tolist(), 'feats_dim':self.feats_dim,
+            'sample_dim':self.sample_dim}
+        if self.conf.mode != 'infer':
+            meta['target_dim'] = self.target_dim
+        self.store.commit(meta)
+        self.load_store()
+
+    def load_store(self):
+        """
+        Set feats, targets and indexing from the store. Arrays are memory-mapped,
+        so nothing is read until fetched.
+        """
+        meta = self.store.read_meta()
+        self.utt_ids = meta['utt_ids']
+        self.utt_beg = np.array(meta['utt_beg'], dtype=np.int64)
+        self.sample_beg = np.array(meta['sample_beg'], dtype=np.int64)
+        (self.feats_dim, self.sample_dim) = (tuple(meta['feats_dim']), tuple(meta['sample_dim']))
+        self.sample_size = int(self.sample_beg[-1])
+        self.make_sample_rows()
+        self.feats = self.store.open('feats')
+        if self.conf.mode != 'infer':
+            self.target_dim = tuple(meta['target_dim'])
+            self.targets = self.store.open('targets')
+
+    def share_memory(self):
+        """
+        Move feats, targets and the frame index into shared memory, so DataLoader
+        workers use the same copy instead of touching their own. Not needed for
+        arrays from the store, which are shared through the page cache.
+        """
+        if self.store is not None or self.shared:
+            return
+        names = ['feats', 'sample_rows']
+        if self.conf.mode != 'infer':
+            names.append('targets')
+        for name in names:
+            self.shared[name] = to_shared(getattr(self, name))
+        self.load_shared()
+
+    def load_shared(self):
+        """
+        Set arrays as views of the shared tensors, see share_memory().
+        """
+        for name, tensor in self.shared.items():
+            setattr(self, name, tensor.numpy())
 
     def to_dataloader(self):
         """
         Transform dataset into the DataLoader object. All dataloader
-        arguments can be speficied in config.
+        arguments can be speficied in config. With 'num_workers' > 0, data is
+        moved to shared memory first and workers are initialized by
+        nnet.worker_init() unless 'worker_init_fn' is given.
         """
-        return data.DataLoader(self, **self.conf_DL.as_kwargs())
+        kwargs = dict(self.conf_dl.as_kwargs())
+        if kwargs['num_workers'] > 0:
+            self.share_memory()
+            if kwargs['worker_init_fn'] is None:
+                kwargs['worker_init_fn'] = worker_init
+        return data.DataLoader(self, **kwargs)
 
     def process_feats(self, feats, spk_id):
         """
@@ -184,6 +321,4 @@ class ConvDataset(data.Dataset):
         if self.conf.add_delta:
             feats = feat.add_delta(feats, delta_order=self.conf.delta_order,
                 delta_window=self.conf.delta_window)
-        if self.conf.apply_lda:
-            feats = feats
         return feats
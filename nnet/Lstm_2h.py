@@ -24,9 +24,65 @@ class Lstm_2h(tnet.Module):
         self.lstm1 = tnet.LSTM(input_size=self.conf.in_dim, hidden_size=self.conf.hid_dim, num_layers=1, batch_first=True)
         self.lstm2 = tnet.LSTM(input_size=self.conf.hid_dim, hidden_size=self.conf.hid_dim, num_layers=1, batch_first=True)
         self.linear = tnet.Linear(self.conf.hid_dim,self.conf.out_dim)
+        self.state = None
+        self.lanes = None
+
+    def carry_state(self, lanes, reset):
+        """
+        Carry hidden states of the next forward() call over from the previous
+        one, per lane, for truncated BPTT on chunks, see nnet.ChunkSampler. The
+        batch item i continues lane lanes[i], its state is reset to zero where
+        reset[i] is True. Carried states are detached, so gradients never flow
+        into the previous chunk. Applies to the next forward() call only.
+        Arguments:
+            lanes ... lane of every batch item, (BS,) int tensor
+            reset ... whether to start the lane with zero state, (BS,) bool tensor
+        """
+        self.lanes = (torch.as_tensor(lanes).long(), torch.as_tensor(reset).bool())
 
     def forward(self, x):
+        """
+        The input is a (BS,T,FD) tensor or a PackedSequence of (T,FD) sequences.
+        For packed input, only valid frames are returned, concatenated in batch
+        order, so padding never reaches the loss or posteriors.
+        """
+        if self.lanes is not None:
+            return self.forward_lanes(x)
         (x,_) = self.lstm1(x)
         (x,_) = self.lstm2(x)
+        if isinstance(x, tnet.utils.rnn.PackedSequence):
+            (x,lengths) = tnet.utils.rnn.pad_packed_sequence(x, batch_first=True)
+            mask = torch.arange(x.shape[1])[None,:] < lengths[:,None]
+            return self.linear(x[mask.to(x.device)])
         x = self.linear(x.reshape(-1,self.conf.hid_dim))
-        return x
\ No newline at end of file
+        return x
+
+    def forward_lanes(self, x):
+        """
+        Forward a (BS,T,FD) batch of chunks with states carried per lane, see
+        carry_state(). States of all lanes are kept as (4,1,lanes,hid_dim) tensor
+        of (h1,c1,h2,c2).
+        """
+        (lanes, reset) = (self.lanes[0].to(x.device), self.lanes[1].to(x.device))
+        self.lanes = None
+        lanes_num = int(lanes.max()) + 1
+        if self.state is not None and _is_inference(self.state) != _is_inference(x):
+            self.state = None
+        if self.state is None or self.state.device != x.device or self.state.shape[2] < lanes_num:
+            state = torch.zeros(4, 1, lanes_num, self.conf.hid_dim, device=x.device)
+            if self.state is not None and self.state.device == x.device:
+                state[:,:,:self.state.shape[2]] = self.state
+            self.state = state
+
+        state = self.state[:,:,lanes]*(~reset).to(x.dtype)[None,None,:,None]
+        (x,(h1,c1)) = self.lstm1(x, (state[0].contiguous(), state[1].contiguous()))
+        (x,(h2,c2)) = self.lstm2(x, (state[2].contiguous(), state[3].contiguous()))
+        self.state[:,:,lanes] = torch.stack((h1,c1,h2,c2)).detach()
+        return self.linear(x.reshape(-1,self.conf.hid_dim))
+
+def _is_inference(x:torch.Tensor) -> bool:
+    """
+    States created under torch.inference_mode() cannot be used for training
+    and vice versa, lanes always reset when switching anyway.
+    """
+    return x.is_inference() if hasattr(x, 'is_inference') else False
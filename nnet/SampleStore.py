@@ -0,0 +1,129 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+
+A persistent store of processed dataset arrays. Datasets write their
+samples/targets once into *.npy files in a store directory and later open
+them memory-mapped, so the data is read through the page cache and shared
+by all processes that open the same store, e.g., DataLoader workers.
+"""
+import os
+from os import path
+import json
+import hashlib
+import numpy as np
+import sleepat
+from sleepat import io, opts
+
+class SampleStore(object):
+    """
+    Memory-mapped store of named arrays plus a JSON manifest. The manifest
+    holds a fingerprint of the inputs the store was built from (dataset options
+    and path/size/mtime of every input file) and any dataset meta information
+    such as per-utterance offsets. The store is valid only if the fingerprint
+    matches, otherwise it is rebuilt. The manifest is written last, so an
+    interrupted build is never mistaken for a valid store.
+
+    Use:
+        store = SampleStore(store_dir, SampleStore.make_fingerprint(conf, scps))
+        if store.is_built():
+            samples = store.open('samples')
+        else:
+            samples = store.create('samples', shape, np.float32)
+            ... fill samples ...
+            store.commit(meta)
+    """
+
+    def __init__(self, store_dir:str, fingerprint:str):
+        """
+        Arguments:
+            store_dir ... directory with the stored arrays
+            fingerprint ... hash of inputs, see make_fingerprint()
+        """
+        self.store_dir = store_dir
+        self.fingerprint = fingerprint
+        self.manifest = path.join(store_dir, 'manifest')
+        self.arrays = dict()
+
+    @staticmethod
+    def sample_opts(conf, flags:tuple) -> dict:
+        """
+        Select dataset options that change the stored arrays, i.e., the given flags
+        and all options of the feature processing steps (splicing, moving average,
+        normalization, deltas, PCA). Options that only change how the data is
+        loaded, e.g., <use_store>, <batch_fetch> or <stream>, are left out, so
+        toggling them keeps the store valid.
+        Input:
+            conf ... dataset options, an opts object
+            flags ... names of dataset options that change the stored arrays
+        Output:
+            sample_opts ... dict of selected options
+        """
+        keys = set(flags)
+        for step in (opts.SpliceFrames, opts.ApplyMa, opts.ApplyMvn, opts.AddDelta, opts.ApplyPca):
+            keys.update(step().as_kwargs())
+        keys.discard('__name__')
+        return {key: val for key, val in conf.as_kwargs().items() if key in keys}
+
+    @staticmethod
+    def make_fingerprint(conf:dict, scps:list) -> str:
+        """
+        Hash dataset options and the path, size and modification time of every
+        file referenced in scps. Files are not read, so this is cheap.
+        Input:
+            conf ... dict of dataset options that change the stored arrays, see sample_opts()
+            scps ... list of scp dicts {key: file}
+        Output:
+            fingerprint ... hex digest
+        """
+        sha = hashlib.sha1()
+        sha.update(json.dumps(conf, sort_keys=True, default=str).encode())
+        for scp in scps:
+            for key, file in scp.items():
+                stat = os.stat(file)
+                sha.update(f'{key}:{file}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+        return sha.hexdigest()
+
+    def is_built(self) -> bool:
+        """
+        Return True if the store exists and was built from the same inputs.
+        """
+        if not path.isfile(self.manifest):
+            return False
+        return io.read_scp(self.manifest).get('fingerprint') == self.fingerprint
+
+    def create(self, name:str, shape:tuple, dtype) -> np.ndarray:
+        """
+        Create a writable memory-mapped array in the store. Any existing
+        manifest is removed first, which invalidates the old store.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        if path.isfile(self.manifest):
+            os.remove(self.manifest)
+        self.arrays[name] = np.lib.format.open_memmap(path.join(self.store_dir,
+            f'{name}.npy'), mode='w+', dtype=dtype, shape=tuple(shape))
+        return self.arrays[name]
+
+    def commit(self, meta:dict=None) -> None:
+        """
+        Flush created arrays and write the manifest with the fingerprint.
+        The meta must be JSON serializable.
+        """
+        for array in self.arrays.values():
+            array.flush()
+        self.arrays = dict()
+        tmp = self.manifest + '.tmp'
+        io.write_scp(tmp, {'fingerprint': self.fingerprint, 'meta': meta})
+        os.replace(tmp, self.manifest)
+
+    def open(self, name:str) -> np.ndarray:
+        """
+        Open a stored array memory-mapped in copy-on-write mode, i.e., reads
+        go through the page cache and writes never reach the file.
+        """
+        return np.load(path.join(self.store_dir, f'{name}.npy'), mmap_mode='c')
+
+    def read_meta(self) -> dict:
+        """
+        Return the meta information saved by commit().
+        """
+        return io.read_scp(self.manifest)['meta']
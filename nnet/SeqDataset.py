@@ -12,15 +12,22 @@ import os
 from os import path
 import numpy as np
 import torch
+from torch import nn as tnet
 from torch.utils import data
 import sleepat
 from sleepat import io, opts, feat, utils
+from sleepat.nnet.SampleStore import SampleStore
+from sleepat.nnet.BucketSampler import BucketSampler
+from sleepat.nnet.ChunkSampler import ChunkSampler
+from sleepat.nnet.to_shared import to_shared
+from sleepat.nnet.worker_init import worker_init
 
 class SeqDataset(data.Dataset):
     """
     Sequential dataset for PyTorch. The input is a data directory that contains
     feats.scp,targets.scp,spk2utt,utt2spk. All data is loaded to memory, so
-    not suitable for very large datasets.
+    not suitable for very large datasets, unless <use_store> is set and the
+    processed data is kept in a memory-mapped nnet.SampleStore instead.
 
     The output is a dictionary with "sample" and "target" keys. The sample is
     a tensor (BS,FD)-dimension, where BS is batch size, and FD is feature
@@ -51,6 +58,21 @@ class SeqDataset(data.Dataset):
             <norm_vars> ... whether to normaliza variances (def: bool=False)
         <apply_mvn> ... whethet to apply mean and variance normalization (def: bool=False)
             <norm_vars> ... whether to normaliza variances (def: bool=False)
+        <pack_seqs> ... batch utterances of similar length into PackedSequences,
+            see to_dataloader() (def:bool = False)
+            <bucket_size> ... no. batches to bucket by length (def:int = 100)
+        <chunk_seqs> ... train on fixed-length chunks in parallel lanes, 'train'
+            mode only, see to_dataloader() (def:bool = False)
+            <seq_len> ... no. frames in a chunk (def:int = 100)
+            <chunk_warmup> ... no. frames of context shared by consecutive chunks,
+                > 0 trains independent windows without carried state instead of
+                truncated BPTT, see nnet.ChunkSampler (def:int = 0)
+        <stream> ... process nothing upfront, utterances are processed one at a
+            time by stream_data() (def:bool = False)
+        <use_store> ... keep processed samples/targets in a memory-mapped store,
+            rebuilt only when inputs change, see nnet.SampleStore (def:bool = False)
+            <store_dir> ... store directory, None is data_dir/store_SeqDataset
+                (def:str = None)
         <<DataLoader args>> ... see torch.utils.data.DataLoader for args.
         config ... a config JSON file to set optional args <>/<<>>
         **kwargs ... setting optional args <>/<<>> through kwargs
@@ -65,14 +87,46 @@ class SeqDataset(data.Dataset):
         self.utt2spk = io.read_scp(path.join(data_dir,'utt2spk'))
         self.periods = io.read_scp(path.join(data_dir,'periods'))
 
+        if self.conf.mode != 'infer':
+            self.annot = io.read_scp(path.join(data_dir,'annot'))
+            self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
+
+        self.shared = dict()
+        self.store = None
+        if self.conf.stream:
+            self.set_sample_dim()
+            return
+        self.store = self.make_store(data_dir) if self.conf.use_store else None
+        if self.store is not None and self.store.is_built():
+            self.load_store()
+            return
         self.set_sample_size()
         self.set_sample_dim()
         self.make_samples()
         if self.conf.mode != 'infer':
-            self.annot = io.read_scp(path.join(data_dir,'annot'))
-            self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
             self.set_target_dim()
-            self.make_targets()     
+            self.make_targets()
+        if self.store is not None:
+            self.save_store()
+
+    def __getstate__(self):
+        """
+        Arrays from the store or in shared memory are not pickled by value, e.g.,
+        when sent to DataLoader workers. Stored arrays are opened again from the
+        store, shared arrays are passed as shared tensors, see share_memory().
+        """
+        state = self.__dict__.copy()
+        if self.store is not None or self.shared:
+            for name in ('samples', 'targets'):
+                state.pop(name, None)
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        if self.store is not None:
+            self.load_store()
+        elif self.shared:
+            self.load_shared()
 
     def __len__(self):
         """
@@ -84,7 +138,10 @@ class SeqDataset(data.Dataset):
         """
         Overwrites default method from torch.utils.data.Dataset class.
         Uses as_tensor() so data is not copied, might be safer to use tensor().
+        A (lane, idx, beg, reset) tuple from nnet.ChunkSampler returns a chunk.
         """
+        if isinstance(idx, tuple):
+            return self.get_chunk(*idx)
         if self.conf.mode == 'eval' or self.conf.mode == 'train':
             return {"index":idx, "target":torch.tensor(self.targets[idx]),
                 "sample":torch.tensor(self.samples[idx])
@@ -92,6 +149,20 @@ class SeqDataset(data.Dataset):
         else:
             return {"index":idx, "sample":torch.tensor(self.samples[idx])}
 
+    def get_chunk(self, lane:int, idx:int, beg:int, reset:bool) -> dict:
+        """
+        Return a chunk of <seq_len> frames of an utterance starting at frame
+        'beg'. Targets of the warm-up shared with the previous chunk are set to -100,
+        the default 'ignore_index' of torch losses, so no frame is scored twice.
+        """
+        end = beg + self.conf.seq_len
+        target = self.targets[idx][beg:end].astype(np.int64)
+        if beg > 0:
+            target[:self.conf.chunk_warmup] = -100
+        return {"index":idx, "lane":lane, "reset":reset,
+            "sample":torch.tensor(self.samples[idx][beg:end]),
+            "target":torch.as_tensor(target)}
+
     def set_sample_size(self):
         """
         Set total number of samples and targets for indexing. Corresponds to
@@ -141,18 +212,27 @@ class SeqDataset(data.Dataset):
         """
         Creates targets for training and evaluatioin. Everything is loaded into
         memory and indexed by self.meta, indexed by int, to trace back utt_id.
-        Feats.scp and targets.scp must be ordered identically.
+        Feats.scp and targets.scp must be ordered identically. With <use_store>
+        the utterances are written one after another into the store, 'beg' and
+        'end' in self.meta are their rows.
         """
         self.meta = dict()
         self.samples = dict()
+        if self.store is not None:
+            samples = self.store.create('samples', (self.frames_size(), self.sample_dim),
+                np.float32)
 
-        idx = 0
-        for utt_id,spk_id in self.utt2spk.items():
+        beg = 0
+        for idx,(utt_id,spk_id) in enumerate(self.utt2spk.items()):
             feats = io.read_npy(self.feats_scp[utt_id])
             feats = self.process_feats(feats, spk_id)
-            self.samples[idx] = feats
-            self.meta[idx] = {'utt_id':utt_id, 'feats_shape':feats.shape}
-            idx += 1
+            end = beg + feats.shape[0]
+            if self.store is not None:
+                samples[beg:end] = feats
+            else:
+                self.samples[idx] = feats
+            self.meta[idx] = {'utt_id':utt_id, 'feats_shape':feats.shape, 'beg':beg, 'end':end}
+            beg = end
 
     def make_targets(self):
         """
@@ -161,22 +241,166 @@ class SeqDataset(data.Dataset):
         Feats.scp and targets.scp must be ordered identically.
         """
         self.targets = dict()
+        if self.store is not None:
+            targets_num = self.meta[len(self.meta)-1]['end']
+            store_targets = self.store.create('targets', (targets_num,) + self.target_dim,
+                np.int32)
 
-        idx = 0
         for idx,utt_id in enumerate(self.utt2spk.keys()):
             targets = io.read_npy(self.targets_scp[utt_id])
             if  self.meta[idx]['feats_shape'][0] !=  targets.shape[0]:
                 print(f'Error: No. feats does not match no. targets for {utt_id}.')
                 exit(1)
-            self.targets[idx] = targets
-            idx += 1
+            if self.store is not None:
+                store_targets[self.meta[idx]['beg']:self.meta[idx]['end']] = targets
+            else:
+                self.targets[idx] = targets
+
+    def frames_size(self) -> int:
+        """
+        Return total number of feature vectors after processing, i.e., rows
+        of the stored samples.
+        """
+        frames_num = 0
+        for (_,m) in feat.feats_to_len(self.feats_scp):
+            if self.conf.splice_frames and self.conf.splice_mode == 'empty':
+                m -= (self.conf.splice_left + self.conf.splice_right)
+            frames_num += m
+        return frames_num
+
+    def make_store(self, data_dir:str) -> SampleStore:
+        """
+        Open the sample store, its fingerprint covers dataset options that change
+        the stored arrays and all input files.
+        """
+        store_dir = self.conf.store_dir
+        if store_dir is None:
+            store_dir = path.join(data_dir, 'store_SeqDataset')
+        scps = [self.feats_scp, self.mvn_scp]
+        if self.conf.mode != 'infer':
+            scps.append(self.targets_scp)
+        conf = SampleStore.sample_opts(self.conf, ('mode','splice_frames','apply_ma','apply_mvn','apply_mvs','add_delta','apply_pca'))
+        conf['utts'] = list(self.utt2spk.items())
+        return SampleStore(store_dir, SampleStore.make_fingerprint(conf, scps))
+
+    def save_store(self):
+        """
+        Commit the store with everything needed by load_store().
+        """
+        meta = {'meta':self.meta, 'sample_size':self.sample_size,
+            'sample_dim':self.sample_dim}
+        if self.conf.mode != 'infer':
+            meta['target_dim'] = self.target_dim
+        self.store.commit(meta)
+        self.load_store()
+
+    def load_store(self):
+        """
+        Set samples, targets and indexing from the store. Every utterance is
+        a view of the memory-mapped arrays, so nothing is read until fetched.
+        """
+        meta = self.store.read_meta()
+        self.meta = {int(idx): dict(item, feats_shape=tuple(item['feats_shape']))
+            for idx, item in meta['meta'].items()}
+        (self.sample_size, self.sample_dim) = (meta['sample_size'], meta['sample_dim'])
+        samples = self.store.open('samples')
+        self.samples = {idx: samples[item['beg']:item['end']] for idx, item in self.meta.items()}
+        if self.conf.mode != 'infer':
+            self.target_dim = tuple(meta['target_dim'])
+            targets = self.store.open('targets')
+            self.targets = {idx: targets[item['beg']:item['end']]
+                for idx, item in self.meta.items()}
+
+    def share_memory(self):
+        """
+        Move samples and targets of all utterances into one shared memory block
+        each, so DataLoader workers use the same copy instead of touching their
+        own. Utterances become views of the blocks. Not needed for arrays from
+        the store, which are shared through the page cache.
+        """
+        if self.store is not None or self.shared:
+            return
+        names = ['samples'] if self.conf.mode == 'infer' else ['samples', 'targets']
+        for name in names:
+            arrays = getattr(self, name)
+            self.shared[name] = to_shared(np.concatenate([arrays[idx]
+                for idx in range(self.sample_size)]))
+            setattr(self, name, None)
+        self.load_shared()
+
+    def load_shared(self):
+        """
+        Set utterances as views of the shared tensors, see share_memory().
+        """
+        for name, tensor in self.shared.items():
+            array = tensor.numpy()
+            setattr(self, name, {idx: array[item['beg']:item['end']]
+                for idx, item in self.meta.items()})
 
     def to_dataloader(self):
         """
         Transform dataset into the DataLoader object. All dataloader
-        arguments can be specified in a config file.
+        arguments can be specified in a config file. With <pack_seqs>, batches
+        are drawn by nnet.BucketSampler and collated by collate(). With
+        <chunk_seqs> in 'train' mode, batches are drawn by nnet.ChunkSampler
+        with 'batch_size' lanes and collated by collate_chunks(). With
+        'num_workers' > 0, data is moved to shared memory first and workers
+        are initialized by nnet.worker_init() unless 'worker_init_fn' is given.
+        """
+        kwargs = dict(self.conf_dl.as_kwargs())
+        if kwargs['num_workers'] > 0:
+            self.share_memory()
+            if kwargs['worker_init_fn'] is None:
+                kwargs['worker_init_fn'] = worker_init
+        chunk_seqs = self.conf.chunk_seqs and self.conf.mode == 'train'
+        if not self.conf.pack_seqs and not chunk_seqs:
+            return data.DataLoader(self, **kwargs)
+
+        lengths = [self.meta[idx]['feats_shape'][0] for idx in range(self.sample_size)]
+        if chunk_seqs:
+            kwargs['batch_sampler'] = ChunkSampler(lengths, kwargs['batch_size'],
+                self.conf.seq_len, self.conf.chunk_warmup, bool(kwargs['shuffle']),
+                kwargs.get('generator'))
+            collate_fn = self.collate_chunks
+        else:
+            kwargs['batch_sampler'] = BucketSampler(lengths, kwargs['batch_size'],
+                bool(kwargs['shuffle']), kwargs['drop_last'], self.conf.bucket_size,
+                kwargs.get('generator'))
+            collate_fn = self.collate
+        kwargs.update(batch_size=1, shuffle=False, sampler=None, drop_last=False,
+            collate_fn=collate_fn)
+        return data.DataLoader(self, **kwargs)
+
+    @staticmethod
+    def collate(batch:list) -> dict:
+        """
+        Collate utterances of different length. Samples are packed into a
+        torch PackedSequence, targets of all utterances are concatenated in
+        batch order, which is the order of valid frames returned by a model
+        on packed input, e.g., nnet.Lstm_2h.
+        """
+        out = {"index":torch.tensor([item["index"] for item in batch]),
+            "sample":tnet.utils.rnn.pack_sequence([item["sample"] for item in batch],
+                enforce_sorted=False)}
+        if "target" in batch[0]:
+            out["target"] = torch.cat([item["target"] for item in batch])
+        return out
+
+    @staticmethod
+    def collate_chunks(batch:list) -> dict:
+        """
+        Collate chunks of one ChunkSampler batch. The last chunk of an utterance
+        can be shorter, chunks are padded to equal length with zero samples and
+        -100 targets. The "lane" and "reset" tensors go to the model, see
+        nnet.Lstm_2h.carry_state().
         """
-        return data.DataLoader(self, **self.conf_dl.as_kwargs())
+        return {"index":torch.tensor([item["index"] for item in batch]),
+            "lane":torch.tensor([item["lane"] for item in batch]),
+            "reset":torch.tensor([item["reset"] for item in batch]),
+            "sample":tnet.utils.rnn.pad_sequence([item["sample"] for item in batch],
+                batch_first=True),
+            "target":tnet.utils.rnn.pad_sequence([item["target"] for item in batch],
+                batch_first=True, padding_value=-100)}
 
     def process_feats(self, feats:np.ndarray, spk_id:str):
         """
@@ -221,11 +445,25 @@ class SeqDataset(data.Dataset):
             idx = idx.numpy()
         
         beg = 0
-        for i in idx:
-            end = self.meta[i]['feats_shape'][0]
-            self.post[i] = post[beg:end].astype(np.float32)
+        for i in np.atleast_1d(idx):
+            end = beg + self.meta[int(i)]['feats_shape'][0]
+            self.post[int(i)] = post[beg:end].astype(np.float32)
             beg = end
 
+    def stream_data(self) -> tuple:
+        """
+        Process features one utterance at a time, for <stream> mode. Output is a
+        stream of tuples (utt_id, time_stamp, samples), where samples is a (1,T,FD)
+        array, i.e., a batch of one sequence.
+        """
+        for utt_id, spk_id in self.utt2spk.items():
+            feats = self.process_feats(io.read_npy(self.feats_scp[utt_id]), spk_id)
+            if hasattr(self, 'periods'):
+                tstamp = self.periods[utt_id]['start']
+            else:
+                tstamp = '00/00/00T00:00:00.000000'
+            yield(utt_id, tstamp, feats[None])
+
     def return_data(self, name:str='post') -> tuple:
         """        
         Return inserted data of specified name, can be targets/feats/posteriors, and
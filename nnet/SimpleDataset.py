@@ -15,12 +15,16 @@ import torch
 from torch.utils import data
 import sleepat
 from sleepat import io, opts, feat, utils
+from sleepat.nnet.SampleStore import SampleStore
+from sleepat.nnet.to_shared import to_shared
+from sleepat.nnet.worker_init import worker_init
 
 class SimpleDataset(data.Dataset):
     """
     Simple dataset for PyTorch. The input is a data directory that contains
     feats.scp,targets.scp,spk2utt,utt2spk. All data is loaded to memory, so
-    not suitable for very large datasets.
+    not suitable for very large datasets, unless <use_store> is set and the
+    processed data is kept in a memory-mapped nnet.SampleStore instead.
 
     The output is a dictionary with "sample" and "target" keys. The sample is
     a tensor (BS,FD)-dimension, where BS is batch size, and FD is feature
@@ -43,6 +47,9 @@ class SimpleDataset(data.Dataset):
             <splice_left> ... no. frames to left to splice onto center frame (def:int = 2)
             <splice_right> ... no. frames to right to splice onto center frame (def:int = 2)
             <splice_mode> ... how to treat edge values, default is to repeat them (def:str='edge')
+            <lazy_splice> ... store unspliced features and splice on fetch (def:bool=False)
+        <batch_fetch> ... fetch whole batches in one __getitem__ call instead of
+            collating single frames, used by to_dataloader() (def:bool = False)
         <add_delta> ... whether to add dynamic coefficients (def:bool = True)
             <delta_window> ... no +-context frames to delta computation (def:int = 2)
             <delta_order> ... order of delta coefficients (def:int = 2)
@@ -50,6 +57,12 @@ class SimpleDataset(data.Dataset):
             <norm_vars> ... whether to normaliza variances (def: bool=False)
         <apply_mvn> ... whethet to apply mean and variance normalization (def: bool=False)
             <norm_vars> ... whether to normaliza variances (def: bool=False)
+        <stream> ... process nothing upfront, utterances are processed one at a
+            time by stream_data() (def:bool = False)
+        <use_store> ... keep processed samples/targets in a memory-mapped store,
+            rebuilt only when inputs change, see nnet.SampleStore (def:bool = False)
+            <store_dir> ... store directory, None is data_dir/store_SimpleDataset
+                (def:str = None)
         <<DataLoader args>> ... see torch.utils.data.DataLoader for args.
         config ... a configuration JSON file to specify all above
         **kwargs ... setting all above through kwargs
@@ -64,14 +77,46 @@ class SimpleDataset(data.Dataset):
         if path.isfile(path.join(data_dir,'periods')):
             self.periods = io.read_scp(path.join(data_dir,'periods'))
 
+        if self.conf.mode != 'infer':
+            self.annot = io.read_scp(path.join(data_dir,'annot'))
+            self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
+
+        self.shared = dict()
+        self.store = None
+        if self.conf.stream:
+            self.set_sample_dim()
+            return
+        self.store = self.make_store(data_dir) if self.conf.use_store else None
+        if self.store is not None and self.store.is_built():
+            self.load_store()
+            return
         self.set_sample_size()
         self.set_sample_dim()
         self.make_samples()
         if self.conf.mode != 'infer':
-            self.annot = io.read_scp(path.join(data_dir,'annot'))
-            self.targets_scp = io.read_scp(path.join(data_dir,'targets.scp'))
             self.set_target_dim()
             self.make_targets()
+        if self.store is not None:
+            self.save_store()
+
+    def __getstate__(self):
+        """
+        Arrays from the store or in shared memory are not pickled by value, e.g.,
+        when sent to DataLoader workers. Stored arrays are opened again from the
+        store, shared arrays are passed as shared tensors, see share_memory().
+        """
+        state = self.__dict__.copy()
+        if self.store is not None or self.shared:
+            for name in ('samples', 'targets', 'feats', 'sample_rows'):
+                state.pop(name, None)
+        return state
+
+    def __setstate__(self, state:dict):
+        self.__dict__.update(state)
+        if self.store is not None:
+            self.load_store()
+        elif self.shared:
+            self.load_shared()
 
     def __len__(self):
         """
@@ -79,17 +124,38 @@ class SimpleDataset(data.Dataset):
         """
         return self.sample_size
 
-    def __getitem__(self, idx:int):
+    def __getitem__(self, idx):
         """
         Overwrites default method from torch.utils.data.Dataset class.
         Uses as_tensor() so data is not copied, might be safer to use tensor().
+        The 'idx' can also be a list of indices (a whole batch, see
+        <batch_fetch>). Consecutive indices are fetched as one slice,
+        others as one fancy-indexed gather.
         """
+        if not np.isscalar(idx):
+            idx = self.to_batch_index(idx)
+        if self.conf.splice_frames and self.conf.lazy_splice:
+            sample = self.samples[self.sample_rows[idx]]
+            sample = torch.as_tensor(sample) if sample.flags.writeable else torch.tensor(sample)
+        else:
+            sample = torch.as_tensor(self.samples[idx])
+        index = torch.arange(idx.start, idx.stop) if isinstance(idx, slice) else idx
         if self.conf.mode == 'eval' or self.conf.mode == 'train':
-            return {"index":idx, "target":torch.as_tensor(self.targets[idx]),
-                "sample":torch.as_tensor(self.samples[idx])
+            return {"index":index, "target":torch.as_tensor(self.targets[idx]),
+                "sample":sample
                 }
         else:
-            return {"index": idx, "sample": torch.as_tensor(self.samples[idx])}
+            return {"index": index, "sample": sample}
+
+    def to_batch_index(self, idx):
+        """
+        Convert a list of indices into a slice if they are consecutive and
+        ascending, otherwise into an int64 np.ndarray.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        if idx.size > 0 and np.all(np.diff(idx) == 1):
+            return slice(int(idx[0]), int(idx[-1])+1)
+        return idx
 
     def set_sample_size(self):
         """
@@ -155,18 +221,65 @@ class SimpleDataset(data.Dataset):
         stores indexes of an utt with respect to samples and annotation.
         Indeces define a half-open Pythonic interval <beg,end).
         """
+        if self.conf.splice_frames and self.conf.lazy_splice:
+            self.make_lazy_samples()
+            return
+
         self.meta = dict()
-        self.samples = np.empty(shape=(self.sample_size, self.sample_dim), dtype=np.float32)
+        self.samples = self.alloc('samples', (self.sample_size, self.sample_dim), np.float32)
 
         beg = 0
         for utt_id, spk_id in self.utt2spk.items():
             feats = io.read_npy(self.feats_scp[utt_id])
-            end = beg + feats.shape[0]
             feats = self.process_feats(feats, spk_id)
+            end = beg + feats.shape[0]
             self.samples[beg:end] = feats
             self.meta[utt_id] = {'beg':beg, 'end':end}
             beg = end
 
+    def make_lazy_samples(self):
+        """
+        Creates samples without materializing the spliced vectors. Processed
+        features of all utterances, padded per utterance as in splice_frames(),
+        are stored once in self.feats. A spliced vector is a flattened window
+        of consecutive rows, so self.samples is a read-only strided view over
+        self.feats and self.sample_rows maps a sample index to its row in the
+        view. Windows that would cross utterance boundaries are never indexed.
+        Samples are identical to the eager make_samples().
+        """
+        (left, right) = (self.conf.splice_left, self.conf.splice_right)
+        context = 1 + left + right
+        feats_dim = self.sample_dim // context
+        pad = 0 if self.conf.splice_mode == 'empty' else left + right
+        rows_num = self.sample_size + len(self.utt2spk)*(left + right)
+
+        self.meta = dict()
+        self.feats = self.alloc('feats', (rows_num, feats_dim), np.float32)
+        self.sample_rows = self.alloc('sample_rows', (self.sample_size,), np.int64)
+
+        (beg, row) = (0, 0)
+        for utt_id, spk_id in self.utt2spk.items():
+            feats = io.read_npy(self.feats_scp[utt_id])
+            feats = self.process_feats(feats, spk_id)
+            if pad:
+                feats = np.pad(feats, ((left,right),(0,0)), mode=self.conf.splice_mode)
+            end = beg + feats.shape[0] - context + 1
+            self.feats[row:row+feats.shape[0]] = feats
+            self.sample_rows[beg:end] = np.arange(row, row + end - beg)
+            self.meta[utt_id] = {'beg':beg, 'end':end}
+            (beg, row) = (end, row + feats.shape[0])
+        self.make_lazy_view()
+
+    def make_lazy_view(self):
+        """
+        Create self.samples as a read-only strided view of spliced vectors
+        over self.feats, see make_lazy_samples().
+        """
+        context = 1 + self.conf.splice_left + self.conf.splice_right
+        self.samples = np.lib.stride_tricks.as_strided(self.feats,
+            shape=(self.feats.shape[0] - context + 1, self.sample_dim),
+            strides=self.feats.strides, writeable=False)
+
     def make_targets(self):
         """
         Creates targets for training and evaluatioin. Everything
@@ -176,8 +289,7 @@ class SimpleDataset(data.Dataset):
         target and the annotation. Indexes  define a half-open Pythonic
         interval <beg,end).
         """
-        self.targets = np.empty(shape=(self.sample_size,)
-            + self.target_dim, dtype=np.int32)
+        self.targets = self.alloc('targets', (self.sample_size,) + self.target_dim, np.int32)
 
         beg = 0
         for utt_id in self.utt2spk.keys():
@@ -188,12 +300,105 @@ class SimpleDataset(data.Dataset):
                 exit(1)
             self.targets[beg:end] = targets
 
+    def alloc(self, name:str, shape:tuple, dtype) -> np.ndarray:
+        """
+        Allocate an array in memory, or in the store if <use_store>.
+        """
+        if self.store is not None:
+            return self.store.create(name, shape, dtype)
+        return np.empty(shape=shape, dtype=dtype)
+
+    def make_store(self, data_dir:str) -> SampleStore:
+        """
+        Open the sample store, its fingerprint covers dataset options that change
+        the stored arrays and all input files.
+        """
+        store_dir = self.conf.store_dir
+        if store_dir is None:
+            store_dir = path.join(data_dir, 'store_SimpleDataset')
+        scps = [self.feats_scp, self.mvn_scp]
+        if self.conf.mode != 'infer':
+            scps.append(self.targets_scp)
+        conf = SampleStore.sample_opts(self.conf, ('mode','splice_frames','lazy_splice','apply_ma','apply_mvn','apply_mvs','add_delta'))
+        conf['utts'] = list(self.utt2spk.items())
+        return SampleStore(store_dir, SampleStore.make_fingerprint(conf, scps))
+
+    def save_store(self):
+        """
+        Commit the store with everything needed by load_store().
+        """
+        meta = {'meta':self.meta, 'sample_size':self.sample_size,
+            'sample_dim':self.sample_dim}
+        if self.conf.mode != 'infer':
+            meta['target_dim'] = self.target_dim
+        self.store.commit(meta)
+        self.load_store()
+
+    def load_store(self):
+        """
+        Set samples, targets and indexing from the store. Arrays are memory-mapped,
+        so nothing is read until fetched.
+        """
+        meta = self.store.read_meta()
+        (self.meta, self.sample_size) = (meta['meta'], meta['sample_size'])
+        self.sample_dim = meta['sample_dim']
+        if self.conf.splice_frames and self.conf.lazy_splice:
+            self.feats = self.store.open('feats')
+            self.sample_rows = self.store.open('sample_rows')
+            self.make_lazy_view()
+        else:
+            self.samples = self.store.open('samples')
+        if self.conf.mode != 'infer':
+            self.target_dim = tuple(meta['target_dim'])
+            self.targets = self.store.open('targets')
+
+    def share_memory(self):
+        """
+        Move samples and targets into shared memory, so DataLoader workers
+        use the same copy instead of touching their own. Not needed for
+        arrays from the store, which are shared through the page cache.
+        """
+        if self.store is not None or self.shared:
+            return
+        names = ['feats', 'sample_rows'] if self.conf.splice_frames and self.conf.lazy_splice else ['samples']
+        if self.conf.mode != 'infer':
+            names.append('targets')
+        for name in names:
+            self.shared[name] = to_shared(getattr(self, name))
+        self.load_shared()
+
+    def load_shared(self):
+        """
+        Set arrays as views of the shared tensors, see share_memory().
+        """
+        for name, tensor in self.shared.items():
+            setattr(self, name, tensor.numpy())
+        if self.conf.splice_frames and self.conf.lazy_splice:
+            self.make_lazy_view()
+
     def to_dataloader(self):
         """
         Transform dataset into the DataLoader object. All dataloader
-        arguments can be specified in a config file.
+        arguments can be specified in a config file. With 'num_workers' > 0,
+        data is moved to shared memory first and workers are initialized
+        by nnet.worker_init() unless 'worker_init_fn' is given.
         """
-        return data.DataLoader(self, **self.conf_dl.as_kwargs())
+        kwargs = dict(self.conf_dl.as_kwargs())
+        if kwargs['num_workers'] > 0:
+            self.share_memory()
+            if kwargs['worker_init_fn'] is None:
+                kwargs['worker_init_fn'] = worker_init
+        if not self.conf.batch_fetch:
+            return data.DataLoader(self, **kwargs)
+
+        # Whole batches are fetched by __getitem__, no collation
+        if kwargs['shuffle']:
+            sampler = data.RandomSampler(self, generator=kwargs.get('generator'))
+        else:
+            sampler = data.SequentialSampler(self)
+        kwargs['sampler'] = data.BatchSampler(sampler, kwargs['batch_size'], kwargs['drop_last'])
+        kwargs.update(batch_size=None, shuffle=False, drop_last=False)
+        return data.DataLoader(self, **kwargs)
 
     def process_feats(self, feats:np.ndarray, spk_id:str):
         """
@@ -207,7 +412,7 @@ class SimpleDataset(data.Dataset):
             feats = feat.apply_mvn(feats,self.mvn_scp[spk_id],**self.conf.as_kwargs())
         if self.conf.add_delta:
             feats = feat.add_delta(feats,**self.conf.as_kwargs())
-        if self.conf.splice_frames:
+        if self.conf.splice_frames and not self.conf.lazy_splice:
             feats = feat.splice_frames(feats,**self.conf.as_kwargs())
         return feats
 
@@ -240,6 +445,22 @@ class SimpleDataset(data.Dataset):
             idx = idx.numpy()
         self.post[idx] = post.astype(np.float32)
 
+    def stream_data(self) -> tuple:
+        """
+        Process features one utterance at a time, for <stream> mode. Output is a
+        stream of tuples (utt_id, time_stamp, samples), where samples is a (T,FD)
+        array of spliced vectors, same as in self.samples.
+        """
+        for utt_id, spk_id in self.utt2spk.items():
+            feats = self.process_feats(io.read_npy(self.feats_scp[utt_id]), spk_id)
+            if self.conf.splice_frames and self.conf.lazy_splice:
+                feats = feat.splice_frames(feats,**self.conf.as_kwargs())
+            if hasattr(self, 'periods'):
+                tstamp = self.periods[utt_id]['start']
+            else:
+                tstamp = '00/00/00T00:00:00.000000'
+            yield(utt_id, tstamp, feats)
+
     def return_data(self, name:str='feats') -> tuple:
         """
         Return inserted data of specified name, can be targets/feats/posteriors, and
@@ -1,3 +1,8 @@
+from .SampleStore import SampleStore
+from .BucketSampler import BucketSampler
+from .ChunkSampler import ChunkSampler
+from .to_shared import to_shared
+from .worker_init import worker_init
 from .SeqDataset import SeqDataset
 from .SimpleDataset import SimpleDataset
 from .ConvDataset import ConvDataset
@@ -0,0 +1,21 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import numpy as np
+import torch
+
+def to_shared(x:np.ndarray) -> torch.Tensor:
+    """
+    Copy an array into a tensor in shared memory. The tensor is passed to
+    DataLoader workers by handle, not by value, and .numpy() returns an
+    array view of the shared memory. Copied once, also for memory-mapped
+    or read-only arrays.
+    Input:
+        x ... np.ndarray of any shape
+    Output:
+        torch.Tensor of the same shape and dtype in shared memory
+    """
+    out = torch.from_numpy(np.empty(shape=(0,), dtype=x.dtype))
+    out = out.new_empty(x.shape).share_memory_()
+    np.copyto(out.numpy(), x)
+    return out
@@ -4,7 +4,11 @@ A routine to train a Torch model.
 """
 import os
 from os import path
+import time
+import resource
 import torch
+from torch import distributed as dist
+from torch.utils import data
 import sleepat
 from sleepat import io, opts
 
@@ -13,14 +17,32 @@ def train_torch(mdl, trainloader, devloader, exp_dir:str, config:str=None, **kwa
     """
     Train a PyTorch model using the trainloader. The trainloader is PyTorch DataLoader object
     that extends a custom PyTorch DataSet object. Use nnet.SimpleDataset.to_dataloader(), i.e.,
-    to create these objects. The training performs 'max_epochs' number of  epochs. Models are
-    saved periodically as defined by 'save_epochs'. The best model is picked based on minimal
-    loss on devloader and linked to 'final.pth'. The default optim is SGD, but any valid Torch
+    to create these objects. The training performs 'max_epochs' number of  epochs, or less
+    with early stopping by 'patience'. Models are saved periodically as defined by 'save_epochs'.
+    The best model is picked based on minimal loss on devloader and linked to 'final.pth'. The default optim is SGD, but any valid Torch
     optim is supported. The default loss is CrossEnropyLoss, but any valid Torch loss is supported.
     The training parameters, loss and optim can have their arguments defined by a config file
     or through kwargs. Only valid torch.loss or torch.optim args are passed to avoid crash.
     Check pyTorch docu for more info. The model is saved as a 'state_dict' so a template is needed
     to load it. We also save 'device' as dict() object into exp_dir/device in JSON format.
+    Batches of chunked sequences carry 'lane' and 'reset', these are passed to
+    mdl.carry_state() before every forward pass, see nnet.ChunkSampler. The dev loss
+    is computed without autograd. Every epoch, throughput (samples/s) and time spent in data
+    loading, forward, backward and optimizer steps of train and dev passes, plus peak RSS, are
+    written to the log and as JSON into exp_dir/train_stats (of process 0 in data-parallel mode).
+    Samples are target frames other than padding (-100). Peak RSS is of the main process
+    only, DataLoader workers are not included.
+
+    With 'ddp_procs' > 1, training runs data-parallel in that many local CPU processes
+    (torch DistributedDataParallel, gloo backend). The processes are spawned, so the
+    model and loaders are pickled and the calling script needs an
+    'if __name__ == '__main__':' guard. Each process draws its part of every epoch
+    through a DistributedSampler and gradients are averaged by all-reduce. Losses are
+    summed over processes, process 0 saves checkpoints, 'train_log.txt' and 'final.pth'
+    as in the single-process mode. Supported are loaders with a default or batch_fetch
+    sampler, not custom batch samplers.
+
+    In both modes, mdl holds the weights of 'final.pth' when training is done.
 
     Arguments:
         mdl ... torch model to train
@@ -33,61 +55,178 @@ def train_torch(mdl, trainloader, devloader, exp_dir:str, config:str=None, **kwa
         <save_epochs> ... save model during these epochs (default:list = [0,1,10,15,....])
         <optim> ... a valid torch optimizer (default = torch.optim.SGD)
         <loss> .... a valid torch loss (default = torch.nn.CrossEntropyLoss)
+        <ddp_procs> ... no. data-parallel processes, 1 is off (default:int = 1)
+            <ddp_port> ... local TCP port for process communication (default:int = 29500)
+            <ddp_threads> ... torch threads per process, None splits all cores (default:int = None)
+        <dev_every> ... compute dev loss every k epochs, 0 only on 'save_epochs', which
+            always have it (default:int = 1)
+        <patience> ... stop after this many dev evaluations without improvement, 0 is off
+            (default:int = 0)
+            <min_delta> ... min. decrease of dev loss to count as improvement (default:float = 0.0)
+        <scheduler> ... a valid torch.optim.lr_scheduler stepped every epoch, ReduceLROnPlateau
+            is stepped on dev loss (default:str = None)
+            <scheduler_args> ... dict of scheduler arguments (default:dict = {})
         <<>> ... arguments for selected torch optimizer, either in <config> or as kwargs
         <<>>  ... arguments for selected torch loss, either in <config> or as kwargs
         **kwargs ... to set optional args. <>/<<>>
     """
+    conf = opts.TrainTorch(config,**kwargs)
+    if conf.max_epochs < 1:
+        raise ValueError('No. epochs max_epochs must be a positive integer.')
+    if conf.ddp_procs > 1:
+        torch.multiprocessing.start_processes(_train, args=(mdl, trainloader, devloader,
+            exp_dir, config, kwargs), nprocs=conf.ddp_procs, start_method='spawn')
+    else:
+        _train(0, mdl, trainloader, devloader, exp_dir, config, kwargs)
+    mdl.load_state_dict(torch.load(path.join(exp_dir,'final.pth'))['state_dict'])
+
+def _train(rank:int, mdl, trainloader, devloader, exp_dir:str, config:str, kwargs:dict) -> None:
+    """
+    Training loop of one process, see train_torch(). Rank 0 does all the saving.
+    """
     # Configuration
     conf = opts.TrainTorch(config,**kwargs)
+    world = conf.ddp_procs
     loss_id = getattr(torch.nn,conf.loss)
     conf_loss = opts.PyClass(loss_id, config,**kwargs)
     loss = loss_id(**conf_loss.as_kwargs())
     optim_id = getattr(torch.optim,conf.optim)
     conf_optim = opts.PyClass(optim_id, config,**kwargs)
     optim = optim_id(mdl.parameters(),**conf_optim.as_kwargs())
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    sched = None
+    if conf.scheduler is not None:
+        sched = getattr(torch.optim.lr_scheduler,conf.scheduler)(optim,**conf.scheduler_args)
+    device = 'cuda' if torch.cuda.is_available() and world == 1 else 'cpu'
     mdl_final = ''
     loss_final = float("inf")
+    (loss_best, bad_evals) = (float("inf"), 0)
     log = list()
+    stats = dict()
 
-    # Initial model/info save
+    # Data-parallel setup, net is the bare model in both modes
     mdl = mdl.to(device)
-    fid = path.join(exp_dir,'0.pth')
-    torch.save({'epoch':0, 'state_dict':mdl.state_dict()}, fid)
-    io.write_scp(path.join(exp_dir,'device'),{'device':device})
-    log.append(f'Training {mdl._get_name()}, initial model saved into {fid}.')
-    log.append(f'Using {device} to train the network.')
+    net = mdl
+    if world > 1:
+        os.environ['MASTER_ADDR'] = '127.0.0.1'
+        os.environ['MASTER_PORT'] = str(conf.ddp_port)
+        dist.init_process_group('gloo', rank=rank, world_size=world)
+        torch.set_num_threads(conf.ddp_threads or max(os.cpu_count()//world, 1))
+        trainloader = _distribute(trainloader, rank, world)
+        devloader = _distribute(devloader, rank, world)
+        mdl = torch.nn.parallel.DistributedDataParallel(net)
+
+    # Initial model/info save
+    if rank == 0:
+        fid = path.join(exp_dir,'0.pth')
+        torch.save({'epoch':0, 'state_dict':net.state_dict()}, fid)
+        io.write_scp(path.join(exp_dir,'device'),{'device':device})
+        log.append(f'Training {net._get_name()}, initial model saved into {fid}.')
+        log.append(f'Using {device} to train the network.')
+        if world > 1:
+            log.append(f'Using {world} data-parallel processes.')
 
     # Training loop
     for epoch in range(1,conf.max_epochs+1):
+        for loader in (trainloader, devloader):
+            if hasattr(loader, 'dist_sampler'):
+                loader.dist_sampler.set_epoch(epoch)
         mdl.train()
         loss_dev, loss_train = 0.0, 0.0
+        train = dict.fromkeys(('samples','data','forward','backward','optim'), 0)
+        tic = time.perf_counter()
         for batch in trainloader:
+            tic = _lap(train, 'data', tic)
             sample = batch['sample'].to(device)
             target = batch['target'].long().to(device)
+            if 'lane' in batch:
+                net.carry_state(batch['lane'], batch['reset'])
 
             optim.zero_grad()
             L = loss(mdl(sample),target.reshape(-1))
+            tic = _lap(train, 'forward', tic)
             L.backward()
+            tic = _lap(train, 'backward', tic)
             optim.step()
             loss_train += L.item()
+            train['samples'] += int((target != -100).sum())
+            tic = _lap(train, 'optim', tic)
 
-        # Dev loss
-        mdl.eval()
-        for batch in devloader:
-            sample = batch['sample'].to(device)
-            target = batch['target'].long().to(device)
-            L = loss(mdl(sample),target.reshape(-1))
-            loss_dev += L.item()
+        # Dev loss, no autograd graphs, on checkpoint epochs and every 'dev_every' epochs
+        dev = None
+        if epoch in conf.save_epochs or (conf.dev_every > 0 and epoch % conf.dev_every == 0):
+            mdl.eval()
+            dev = dict.fromkeys(('samples','data','forward'), 0)
+            with getattr(torch, 'inference_mode', torch.no_grad)():
+                tic = time.perf_counter()
+                for batch in devloader:
+                    tic = _lap(dev, 'data', tic)
+                    sample = batch['sample'].to(device)
+                    target = batch['target'].long().to(device)
+                    if 'lane' in batch:
+                        net.carry_state(batch['lane'], batch['reset'])
+                    L = loss(mdl(sample),target.reshape(-1))
+                    loss_dev += L.item()
+                    dev['samples'] += int((target != -100).sum())
+                    tic = _lap(dev, 'forward', tic)
+        if world > 1:
+            losses = torch.tensor([loss_train, loss_dev], dtype=torch.float64)
+            dist.all_reduce(losses)
+            (loss_train, loss_dev) = losses.tolist()
 
         # Save training checkpoint
-        if epoch in conf.save_epochs:
+        if epoch in conf.save_epochs and rank == 0:
             fid = path.join(exp_dir,str(epoch)+'.pth')
-            torch.save({'epoch':epoch,'state_dict':mdl.state_dict()},fid)
+            torch.save({'epoch':epoch,'state_dict':net.state_dict()},fid)
             if loss_dev < loss_final:
                 loss_final = loss_dev
                 mdl_final = fid
             log.append(f'epoch: {epoch}, L_train={round(loss_train,3)}, L_dev={round(loss_dev,3)}')
+
+        # Learning rate schedule and early stopping, same decision in all processes
+        stop = False
+        if dev is not None:
+            if loss_dev < loss_best - conf.min_delta:
+                (loss_best, bad_evals) = (loss_dev, 0)
+            else:
+                bad_evals += 1
+            stop = conf.patience > 0 and bad_evals >= conf.patience
+        if isinstance(sched, torch.optim.lr_scheduler.ReduceLROnPlateau):
+            if dev is not None:
+                sched.step(loss_dev)
+        elif sched is not None:
+            sched.step()
+
+        # Epoch throughput and timing
+        if rank == 0:
+            for item in (train, dev):
+                if item is not None:
+                    item['time'] = sum(val for key,val in item.items() if key != 'samples')
+                    item['samples_per_sec'] = item['samples']/max(item['time'], 1e-9)
+            stats[epoch] = {'train':train, 'dev':dev,
+                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024}
+            io.write_scp(path.join(exp_dir,'train_stats'), stats)
+            line = (f'epoch: {epoch}, train {round(train["samples_per_sec"])} samples/s '
+                f'(data {round(train["data"],2)}s, forward {round(train["forward"],2)}s, '
+                f'backward {round(train["backward"],2)}s, optim {round(train["optim"],2)}s), ')
+            if dev is not None:
+                line += (f'dev {round(dev["samples_per_sec"])} samples/s (data {round(dev["data"],2)}s, '
+                    f'forward {round(dev["forward"],2)}s), ')
+            log.append(line + f'peak RSS {round(stats[epoch]["peak_rss_mb"])} MB main process')
+        if stop:
+            if rank == 0:
+                log.append(f'Early stopping in epoch {epoch}, no dev loss improvement '
+                    f'in {bad_evals} evaluations.')
+            break
+
+    # No checkpoint epoch reached, keep the last model
+    if rank == 0 and not mdl_final:
+        mdl_final = path.join(exp_dir,str(epoch)+'.pth')
+        torch.save({'epoch':epoch,'state_dict':net.state_dict()},mdl_final)
+    if world > 1:
+        dist.barrier()
+        dist.destroy_process_group()
+    if rank != 0:
+        return
     os.symlink(mdl_final, f'{exp_dir}/final.pth')
 
     # Write info into a log
@@ -95,3 +234,39 @@ def train_torch(mdl, trainloader, devloader, exp_dir:str, config:str=None, **kwa
     with open(path.join(exp_dir,'train_log.txt'), 'w') as log_fid:
         for line in log:
             print(line, file=log_fid)
+
+def _lap(stats:dict, key:str, tic:float) -> float:
+    """
+    Add time elapsed since 'tic' to stats[key] and return current time.
+    """
+    toc = time.perf_counter()
+    stats[key] += toc - tic
+    return toc
+
+def _distribute(loader, rank:int, world:int):
+    """
+    Rebuild a DataLoader so that it draws only its part of the dataset through
+    a DistributedSampler. Shuffling and batching follow the original loader, for
+    batch_fetch loaders the distributed indices are batched by a BatchSampler.
+    The sampler is kept as loader.dist_sampler for set_epoch().
+    """
+    batch_fetch = loader.batch_size is None and isinstance(loader.sampler, data.BatchSampler)
+    sampler = loader.sampler.sampler if batch_fetch else loader.sampler
+    if loader.batch_size is None and not batch_fetch or not isinstance(sampler,
+        (data.RandomSampler, data.SequentialSampler)):
+        raise ValueError('Data-parallel training needs a default or batch_fetch DataLoader sampler.')
+
+    dist_sampler = data.DistributedSampler(loader.dataset, num_replicas=world, rank=rank,
+        shuffle=isinstance(sampler, data.RandomSampler))
+    kwargs = dict(num_workers=loader.num_workers, collate_fn=loader.collate_fn,
+        pin_memory=loader.pin_memory, timeout=loader.timeout,
+        worker_init_fn=loader.worker_init_fn)
+    if batch_fetch:
+        batch_sampler = loader.sampler
+        dist_loader = data.DataLoader(loader.dataset, batch_size=None, sampler=data.BatchSampler(
+            dist_sampler, batch_sampler.batch_size, batch_sampler.drop_last), **kwargs)
+    else:
+        dist_loader = data.DataLoader(loader.dataset, batch_size=loader.batch_size,
+            sampler=dist_sampler, drop_last=loader.drop_last, **kwargs)
+    dist_loader.dist_sampler = dist_sampler
+    return dist_loader
@@ -0,0 +1,14 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import torch
+
+def worker_init(worker_id:int) -> None:
+    """
+    Init function of DataLoader worker processes, pass it as 'worker_init_fn'.
+    Limits every worker to one intra-op thread, so N workers do not start
+    N thread pools competing with the training process for cores.
+    Input:
+        worker_id ... id of the worker, set by DataLoader
+    """
+    torch.set_num_threads(1)
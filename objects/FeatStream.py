@@ -0,0 +1,143 @@
+"""
+Made by Michal Borsky, 2020, copyright (C) RU
+"""
+import math
+import numpy as np
+import scipy
+from scipy import fftpack
+import sleepat
+from sleepat import dsp, feat, opts
+
+class FeatStream(object):
+    """
+    A streaming feature extractor for signals that do not fit into memory. The
+    signal is pushed in chunks of arbitrary length and feature frames are returned
+    as soon as they are complete. The preemphasis sample and the frame overlap are
+    carried over chunk boundaries, so the concatenated output is identical to the
+    batch feat.compute_mfcc()/compute_bfcc()/compute_fbank()/compute_c1() output.
+    Memory is bounded by the chunk size, not the signal length.
+
+    The batch power spectrum is normalized by the total number of frames, so
+    'num_samples' (the full signal length) must be known to reproduce the batch
+    output exactly. Without it the spectrum is not normalized, which shifts the
+    log energies (and c0) by a constant. C1 features do not depend on it.
+
+    Use:
+        stream = FeatStream('mfcc', num_samples=len(wave), config=mfcc_conf)
+        feats = [stream.push(chunk) for chunk in chunks] + [stream.flush()]
+        feats = np.concatenate(feats)
+    """
+
+    def __init__(self, feat_type:str='mfcc', num_samples:int=None, config:str=None, **kwargs):
+        """
+        Optional args <> can be set from a config file or as **kwargs, see
+        feat.compute_mfcc(), feat.compute_bfcc(), feat.compute_fbank(), feat.compute_c1().
+
+        Arguments:
+            feat_type ... type of features ('mfcc'|'bfcc'|'fbank'|'c1') (def:str = 'mfcc')
+            num_samples ... total signal length in samples (def:int = None)
+            config ... a config JSON file to set optional args <>
+            **kwargs ... setting optional args <> through kwargs
+        """
+        if feat_type == 'mfcc':
+            self.conf = opts.Mfcc(config,**kwargs)
+            (self.fbank_type, self.alpha) = ('melfb', self.conf.preemphasis_alpha)
+        elif feat_type == 'bfcc':
+            self.conf = opts.Bfcc(config,**kwargs)
+            (self.fbank_type, self.alpha) = ('barkfb', None)
+        elif feat_type == 'fbank':
+            self.conf = opts.Fbank(config,**kwargs)
+            (self.fbank_type, self.alpha) = (self.conf.fbank_type, self.conf.preemphasis_alpha)
+        elif feat_type == 'c1':
+            self.conf = opts.C1(config,**kwargs)
+            (self.fbank_type, self.alpha) = (None, None)
+        else:
+            raise ValueError(f'Unsupported feature type {feat_type}.')
+        if self.alpha is not None and self.alpha < 0:
+            raise ValueError('Filter coefficient alpha must be a float in <0,1> range')
+
+        self.feat_type = feat_type
+        self.flen = math.ceil(self.conf.wlen*self.conf.fs)
+        self.fstep = math.ceil(self.conf.wstep*self.conf.fs)
+        self.nfft = np.around(self.conf.wlen*self.conf.fs).astype(np.uint16)
+        self.norm = 1.0
+        if num_samples is not None:
+            self.norm = 1/max((num_samples-self.flen)//self.fstep + 1, 1)
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Reset the stream state, i.e., start a new signal.
+        """
+        self.last = None
+        self.buffer = np.empty(shape=(0,))
+
+    def push(self, chunk:np.ndarray) -> np.ndarray:
+        """
+        Push next chunk of the signal into the stream and return features for
+        all frames completed by it. The output can have zero rows.
+
+        Arguments:
+            chunk ... next part of the signal as (t,) or (t,1) np.ndarray
+        Output:
+            feats ... np.ndarray(shape=(num_frames,dim), dtype=np.float32)
+        """
+        chunk = np.asarray(chunk).reshape(-1)
+        if chunk.size == 0:
+            return self.to_feats(np.empty(shape=(0,self.flen), dtype=np.float32))
+
+        # Preemphasis with the carried-over sample
+        if self.alpha is not None:
+            if self.last is None:
+                x = dsp.preemphasis(chunk, self.alpha)
+            else:
+                x = chunk - self.alpha*np.append(self.last, chunk[:-1])
+            self.last = chunk[-1:]
+        else:
+            x = chunk
+
+        # Framing with the carried-over overlap, buffer starts at next frame
+        self.buffer = np.concatenate((self.buffer, x))
+        frames = dsp.segment(self.buffer, self.conf.fs, self.conf.wlen, self.conf.wstep,
+            self.conf.remove_dc, self.conf.wtype)
+        self.buffer = self.buffer[frames.shape[0]*self.fstep:]
+        return self.to_feats(frames)
+
+    def flush(self) -> np.ndarray:
+        """
+        Finish the signal. Incomplete frames are dropped as in dsp.segment(), so
+        no new features are produced, but an empty array with correct dimension
+        is returned for convenience. The stream is reset afterwards.
+
+        Output:
+            feats ... np.ndarray(shape=(0,dim), dtype=np.float32)
+        """
+        self.reset()
+        return self.to_feats(np.empty(shape=(0,self.flen), dtype=np.float32))
+
+    def to_feats(self, frames:np.ndarray) -> np.ndarray:
+        """
+        Transform a matrix of frames into features, same as the batch routines.
+        """
+        if self.feat_type == 'c1':
+            return feat.frames_to_c1(frames)
+
+        pow_frames = dsp.rfft_frames(frames, self.nfft, power=True,
+            workers=self.conf.fft_workers)
+        pow_frames *= self.norm
+
+        if self.fbank_type == 'melfb':
+            fbank = dsp.melfb(self.conf.mel_filts, self.conf.fs, self.nfft,
+                self.conf.fmin, self.conf.fmax)
+        else:
+            fbank = dsp.barkfb(self.conf.fs, self.nfft, self.conf.fmin, self.conf.fmax)
+        fbank_feats = np.dot(pow_frames,fbank.T)
+        if self.conf.use_log_fbank:
+            if self.feat_type != 'bfcc':
+                fbank_feats = np.where(fbank_feats == 0, np.finfo(float).eps, fbank_feats)
+            fbank_feats = 10*np.log10(fbank_feats + np.finfo(float).eps)
+
+        if self.feat_type == 'fbank':
+            return fbank_feats.astype(np.float32)
+        ceps = fftpack.dct(fbank_feats, type=2, axis=1, norm='ortho')
+        return ceps[:,:self.conf.nceps].astype(np.float32)
@@ -1 +1,2 @@
+from .FeatStream import FeatStream
 from .TimeStamp import TimeStamp
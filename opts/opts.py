@@ -73,11 +73,13 @@ class Spect(BaseOpts):
     def __init__(self):
         self.__name__ = 'SpectOpts'
         self.register_from_opts(Segment())
+        self.fft_workers = None
 
 class PowSpect(BaseOpts):
     def __init__(self):
         self.__name__ = 'PowSpectOpts'
         self.register_from_opts(Segment())
+        self.fft_workers = None
 
 class Preemph(BaseOpts):
     def __init__(self):
@@ -175,6 +177,7 @@ class C1(BaseOpts):
     def __init__(self, config:str=None, **kwargs):
         self.__name__ = 'C1'
         self.register_from_opts(Segment())
+        self.chunk_size = 4096
         self.update(config,**kwargs)
 
 class Acf(BaseOpts):
@@ -184,6 +187,7 @@ class Acf(BaseOpts):
         self.register_from_opts(Preemph())
         self.actype = 'same'
         self.nacf = 320
+        self.acf_method = 'direct'
         self.update(config,**kwargs)
 
 class AddDelta(BaseOpts):
@@ -191,6 +195,7 @@ class AddDelta(BaseOpts):
         self.__name__ = 'AddDelta'
         self.register_from_opts(Delta())
         self.delta_order = 2
+        self.delta_compose = False
         self.update(config,**kwargs)
 
 class SpliceFrames(BaseOpts):
@@ -199,6 +204,7 @@ class SpliceFrames(BaseOpts):
         self.splice_left = 2
         self.splice_right = 2
         self.splice_mode = 'edge'
+        self.splice_view = False
         self.update(config,**kwargs)
 
 class ApplyLifter(BaseOpts):
@@ -301,6 +307,14 @@ class TrainTorch(BaseOpts):
         self.save_epochs = [1,5,10,15,20,30,40,50,60,70,80,90,100]
         self.optim ='SGD'
         self.loss = 'CrossEntropyLoss'
+        self.ddp_procs = 1
+        self.ddp_port = 29500
+        self.ddp_threads = None
+        self.dev_every = 1
+        self.patience = 0
+        self.min_delta = 0.0
+        self.scheduler = None
+        self.scheduler_args = dict()
         self.update(config,**kwargs)
 
 class Cnn_1c2h(BaseOpts):
@@ -355,6 +369,11 @@ class SimpleDataset(BaseOpts):
         self.apply_mvs = False
         self.add_delta = True
         self.mode = 'infer'
+        self.lazy_splice = False
+        self.batch_fetch = False
+        self.stream = False
+        self.use_store = False
+        self.store_dir = None
         self.update(config,**kwargs)
 
         if self.apply_ma:
@@ -380,6 +399,8 @@ class ConvDataset(BaseOpts):
         self.apply_mvs = False
         self.add_delta = True
         self.mode = 'infer'
+        self.use_store = False
+        self.store_dir = None
         self.update(config,**kwargs)
 
         if self.apply_mvn or self.apply_mvs:
@@ -403,6 +424,13 @@ class SeqDataset(BaseOpts):
         self.add_delta = True
         self.apply_pca = True
         self.mode = 'infer'
+        self.pack_seqs = False
+        self.bucket_size = 100
+        self.chunk_seqs = False
+        self.chunk_warmup = 0
+        self.stream = False
+        self.use_store = False
+        self.store_dir = None
         self.update(config,**kwargs)
 
         if self.apply_ma:
@@ -427,6 +455,15 @@ class TrainNnet(BaseOpts):
         self.update(config_mdl,**kwargs)
         self.update(config_ds,**kwargs)
 
+class DecodeNnet(BaseOpts):
+    def __init__(self,config:str=None, **kwargs):
+        self.__name__='DecodeNnet'
+        self.stream = False
+        self.batch_size = 256
+        self.num_threads = None
+        self.nj = 1
+        self.update(config,**kwargs)
+
 ## Objects Options
 #--------------------------------------------------------------
 class TimeStamp(BaseOpts):
@@ -1,4 +1,5 @@
 from .decode_nnet import decode_nnet
+from .make_feats import make_feats
 from .make_bfcc import make_bfcc
 from .make_targets import make_targets
 from .make_mfcc import make_mfcc
@@ -3,20 +3,32 @@ Made by Michal Borsky, 2019, copyright (C) RU
 Decode a Deep Neural Network.
 """
 import os
+import shutil
 from os import path
+import numpy as np
 import torch
 import sleepat
 from sleepat import io, nnet, utils, steps, opts
 
 
 def decode_nnet(data_dir:str, lang_dir:str, exp_dir:str, config_mdl:str=None, config_ds:str=None,
-    config_feats:str=None) -> None:
+    config_feats:str=None, config_decode:str=None) -> None:
     """
     Decode with a DNN model saved in exp_dir. The dataset is a SimpleDataset object.
     See SimpleDataset() for content of  config_dataset. See DnnSnore for content of
     config_mdl. See train_mdl() for content of config_optim and  No kwargs transfer
     allowed from func. header to any config_* to avoid confusion.
 
+    In the <stream> mode, nothing is loaded upfront. Each utterance is processed end-to-end,
+    i.e., features, forward pass in batches of <batch_size> under inference mode, posteriors,
+    scoring and writing, before the next one is read. Memory is bounded by the largest
+    utterance and results appear as soon as the first utterance is done.
+
+    In the <nj> mode, data_dir is split per recording into decode_dir/split<nj> and the
+    shards are decoded by a pool of <nj> processes. split<nj> is recreated on every run,
+    so shards left over from an older data_dir are never decoded. post.scp and trans
+    are merged in the order of data_dir, so the output does not depend on <nj>.
+
     Arguments:
         data_dir .... directory with training data
         lang_dir ... directory that contains events.txt file
@@ -25,6 +37,13 @@ def decode_nnet(data_dir:str, lang_dir:str, exp_dir:str, config_mdl:str=None, co
         <config_dataset> .... configuration file for SimpleDataset()
         <config_mdl> ... configuration file for DnnSnore()
         <config_feats> ... configuration file for targets_to_annot()
+        <config_decode> ... configuration file for decoding options below
+            <stream> ... decode one utterance at a time (default:bool = False)
+            <batch_size> ... no. samples in a forward pass in <stream> mode (default:int = 256)
+            <num_threads> ... no. torch intra-op threads, None keeps default, with <nj> > 1
+                it is per worker and None is cpu_count//nj (default:int = None)
+            <nj> ... no. parallel jobs, the data is split per recording and every job
+                decodes its shard with its own copy of the model (default:int = 1)
     """
     # Loads and Checks
     print(f'Decoding {data_dir} into {exp_dir}.')
@@ -46,44 +65,93 @@ def decode_nnet(data_dir:str, lang_dir:str, exp_dir:str, config_mdl:str=None, co
         print(f'Error: events is empty.')
         exit(1)
 
+    conf_dec = opts.DecodeNnet(config_decode)
+    final = path.join(exp_dir,'final.pth')
+    if not path.exists(final):
+        print(f'Error: {final} does not exist.')
+        exit(1)
+
+    post_dir = path.join(decode_dir,'post')
+    if not path.isdir(post_dir):
+        os.mkdir(post_dir)
+    else:
+        for file in utils.list_files(post_dir):
+            os.remove(path.join(post_dir,file))
+
+    # Decode in-process, or split per recording and decode the shards in parallel
+    args = (lang_dir, exp_dir, post_dir, config_mdl, config_ds, config_feats, config_decode)
+    if conf_dec.nj > 1:
+        split_dir = path.join(decode_dir,f'split{conf_dec.nj}')
+        if path.isdir(split_dir):
+            shutil.rmtree(split_dir)
+        shard_dirs = utils.split_data_per_job(data_dir, split_dir, conf_dec.nj)
+        results = utils.run_parallel(_decode_data, [(shard_dir,) + args for shard_dir in shard_dirs],
+            conf_dec.nj, conf_dec.num_threads)
+    else:
+        results = [_decode_data(data_dir, *args)]
+
+    # Merge shards in the order of recordings in data_dir
+    (post_scp, trans_scp) = dict(),dict()
+    for (shard_post, shard_trans) in results:
+        post_scp.update(shard_post)
+        trans_scp.update(shard_trans)
+    order = {utt: i for i, utt in enumerate(io.read_scp(path.join(data_dir,'rec2sub')))}
+    unknown = [utt for utt in post_scp if utt not in order]
+    if unknown:
+        raise ValueError(f'Decoded utterances {unknown} are not in {data_dir}/rec2sub.')
+    utts = sorted(post_scp, key=lambda utt: order[utt])
+    post_scp = {utt: post_scp[utt] for utt in utts}
+    trans_scp = {utt: trans_scp[utt] for utt in utts}
+
+    io.write_scp(path.join(decode_dir,'post.scp'),post_scp)
+    io.write_scp(path.join(decode_dir,'trans'),trans_scp)
+    steps.score_detect(data_dir, lang_dir, decode_dir)
+
+    print(f'Decoding done.')
+
+def _decode_data(data_dir:str, lang_dir:str, exp_dir:str, post_dir:str, config_mdl:str=None,
+    config_ds:str=None, config_feats:str=None, config_decode:str=None) -> tuple:
+    """
+    Decode data_dir with the final model in exp_dir, write posteriors into post_dir
+    and return (post_scp, trans_scp). Runs in a worker process in the <nj> mode,
+    so every worker loads its own copy of the model.
+    """
+    events = io.read_scp(path.join(lang_dir,'events'))
     conf = opts.TrainNnet(config_mdl, config_ds)
-    device = io.read_scp(device_fid)['device']        
+    conf_dec = opts.DecodeNnet(config_decode)
+    if conf_dec.num_threads is not None:
+        torch.set_num_threads(conf_dec.num_threads)
+    device = io.read_scp(path.join(exp_dir,'device'))['device']
     events_num = len(set(events.values()))
 
     # Create dataset object
     dataset = getattr(nnet,conf.dataset)
-    evalds = dataset(data_dir,config=config_ds, mode='eval')
-    evalds.init_infer(events)
+    evalds = dataset(data_dir,config=config_ds, mode='eval', stream=conf_dec.stream)
     sample_dim = evalds.sample_dim
 
     # Init a blank model and load from save
-    final = path.join(exp_dir,'final.pth')
-    if not path.exists(final):
-        print(f'Error: {final} does not exist.')
-        exit(1)
     model = getattr(nnet,conf.model)
     mdl = model(config=config_mdl, in_dim=sample_dim, out_dim=events_num)
-    mdl.load_state_dict(torch.load(final)['state_dict'])
+    mdl.load_state_dict(torch.load(path.join(exp_dir,'final.pth'))['state_dict'])
     mdl.to(device)
     mdl.eval()
 
-    # Inference
-    for batch in evalds.to_dataloader():
-        sample = batch['sample'].to(device)
-        output = mdl(sample)
-        post = torch.nn.functional.softmax(output,dim=1)
-        evalds.insert_post(post, batch['index'])
+    # Inference, whole dataset at once or a generator over utterances
+    if conf_dec.stream:
+        posts = _stream_post(evalds, mdl, device, conf_dec.batch_size)
+    else:
+        evalds.init_infer(events)
+        with getattr(torch, 'inference_mode', torch.no_grad)():
+            for batch in evalds.to_dataloader():
+                sample = batch['sample'].to(device)
+                output = mdl(sample)
+                post = torch.nn.functional.softmax(output,dim=1)
+                evalds.insert_post(post, batch['index'])
+        posts = evalds.return_data('post')
 
     # Make post files which contain frame-level posteriors
     (post_scp, trans_scp) = dict(),dict()
-    post_dir = path.join(decode_dir,'post')
-    if not path.isdir(post_dir):
-        os.mkdir(post_dir)
-    else:
-        for file in utils.list_files(post_dir):
-            os.remove(path.join(post_dir,file))
-
-    for (utt_id,tstamp,post) in evalds.return_data('post'):
+    for (utt_id,tstamp,post) in posts:
         pred = post.argmax(axis=1)
         trans = utils.targets_to_scoring(pred,post,events,config_feats,tstamp=tstamp)
         trans_scp[utt_id] = trans
@@ -92,10 +160,19 @@ def decode_nnet(data_dir:str, lang_dir:str, exp_dir:str, config_mdl:str=None, co
         post_fid = path.join(post_dir,f'{utt_id}.post.npy')
         io.write_npy(post_fid,post)
         post_scp[utt_id] = post_fid
+    return (post_scp, trans_scp)
 
-    io.write_scp(path.join(decode_dir,'post.scp'),post_scp)
-    io.write_scp(path.join(decode_dir,'trans'),trans_scp)
-    steps.score_detect(data_dir, lang_dir, decode_dir)
-
-    print(f'Decoding done.')
-
+def _stream_post(evalds, mdl, device:str, batch_size:int) -> tuple:
+    """
+    Decode one utterance at a time from dataset stream_data(). Samples are
+    forwarded in batches of batch_size along the first axis. Output is a
+    stream of tuples (utt_id, time_stamp, posteriors).
+    """
+    for (utt_id, tstamp, samples) in evalds.stream_data():
+        post = list()
+        with getattr(torch, 'inference_mode', torch.no_grad)():
+            for beg in range(0, samples.shape[0], batch_size):
+                sample = torch.as_tensor(samples[beg:beg+batch_size]).to(device)
+                output = mdl(sample)
+                post.append(torch.nn.functional.softmax(output,dim=1).cpu())
+        yield (utt_id, tstamp, torch.cat(post).numpy().astype(np.float32))
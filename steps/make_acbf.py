@@ -2,12 +2,11 @@
 Made by Michal Borsky, 2019, copyright (C) RU
 Compute autocorrelation bottleneck features.
 """
-import os
-from os import path
 import sleepat
-from sleepat import io, utils, feat
+from sleepat import steps
 
-def make_acbf(data_dir:str, feat_dir:str, exp_dir:str, config:str=None, **kwargs) -> None:
+def make_acbf(data_dir:str, feat_dir:str, exp_dir:str, config:str=None, nj:int=1,
+    num_threads:int=None, **kwargs) -> None:
     """
     Compute autocorrelation bottleneck features.
     Arguments:
@@ -21,40 +20,18 @@ def make_acbf(data_dir:str, feat_dir:str, exp_dir:str, config:str=None, **kwargs
         <nacf> ... num. of autocorrelation features as input to AutoEnc. (default:int = 320)
         <actype> ... autocorrelation type options include ('same'|'full'),
             (default:str = 'same')
+        <acf_method> ... 'direct'|'fft' autocorrelation computation, 'fft' is much
+            faster for long windows (default:str = 'direct')
         <nacbf> ... num. of autocorrelation bottleneck features, effectively dimension of
             bottleneck layer (default:int = 16)
         config .... config file to pass optional args. <> (default:str=None)
+        nj ... no. parallel jobs, see make_feats() (default:int = 1)
+        num_threads ... no. threads per job with nj > 1, see make_feats() (default:int = None)
         **kwargs ... optional args. <>
     """
     print(f'Computing ACBF for {data_dir}.')
-    utils.validate_data(data_dir,no_feats=True)
-
-    if not path.isdir(feat_dir):
-        os.mkdir(feat_dir)
-    wave_scp = io.read_scp(path.join(data_dir,'wave.scp'))
-    utt2seg = path.join(data_dir,'utt2seg')
-    acf_scp = dict()
-
     # Compute AutoCorrelation features
-    if path.isfile(utt2seg):
-        print(f'{" ":3}Utt2seg file found, assuming waveforms are indexed by seg_id.')
-        utt2seg = io.read_scp(utt2seg)
-        for utt_id, item in wave_scp.items():
-            wave = io.read_npy(item['file'])
-            for (seg_id, seg_wave) in utils.segment_wave(wave, item['fs'], utt2seg[utt_id]):
-                file = path.join(feat_dir, f'{seg_id}.acf.npy')
-                acf = feat.compute_acf(seg_wave, config, **kwargs)
-                io.write_npy(file, acf)
-                acf_scp[seg_id] = file
-    else:
-        print(f'{" ":3}No utt2seg file found, assuming waveforms are indexed by utt_id.')
-        for utt_id, item in wave_scp.items():
-            wave = io.read_npy(item['file'])
-            file = path.join(feat_dir, f'{utt_id}.acf.npy')
-            acf = feat.compute_acf(wave, config, **kwargs)
-            io.write_npy(file, acf)
-            acf_scp[utt_id] = file
-    io.write_scp(path.join(data_dir,'acf.scp'), acf_scp)
+    steps.make_feats(data_dir, feat_dir, 'acf', config, nj, num_threads, **kwargs)
 
     # Train AutoEncoder
 
@@ -0,0 +1,136 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Collection of high-level routines used to built whole projects.
+"""
+import os
+from os import path
+import json
+import hashlib
+import sleepat
+from sleepat import io, utils, feat, opts
+
+def make_feats(data_dir:str, feat_dir:str, feat_type:str='mfcc', config:str=None,
+    nj:int=1, num_threads:int=None, **kwargs) -> None:
+    """
+    Extract features of feat_type with feat.compute_<feat_type>() for every
+    waveform in wave.scp and save them as feat_dir/<utt_id>.<feat_type>.npy. The
+    list of files goes into data_dir/<feat_type>.scp. If utt2seg exists, waveforms
+    are cut into segments and files are named by seg_id. The waveform is then opened
+    memory-mapped and every segment is processed as it is sliced, so only the pages
+    covering the segment are read and the recording is never copied into memory.
+
+    Every feature file gets a manifest <utt_id>.<feat_type>.manifest with a hash of
+    the wave path, size and modification time, the segment and the resolved
+    opts.<Feat_type> options. Files with a matching manifest are up to date and are
+    not recomputed, a wave is not even read if all its segments are up to date.
+    The manifest is written after the feature file, so a crashed run resumes
+    with the first file it did not finish.
+
+    With nj > 1, wave.scp is split into nj contiguous shards processed by a pool
+    of nj processes, every worker is limited to num_threads BLAS/OpenMP/torch threads.
+    With nj = 1, everything runs in the calling process and num_threads is not used.
+    scipy.fft threads are set by <fft_workers> in both modes, it changes the FFT
+    backend (see feat.compute_mfcc()), so it is not tied to num_threads.
+    Each worker writes a partial scp into feat_dir, the partial scps are merged
+    in the order of shards and removed, so the output is the same for any nj.
+    Input:
+        data_dir .... input data directory
+        feat_dir .... output directory for feature files
+        feat_type ... 'mfcc'|'bfcc'|'acf'|'fbank'|'c1' (default:str = 'mfcc')
+        config .... config file to pass optional args. of feat.compute_<feat_type>()
+        nj ... no. parallel jobs (default:int = 1)
+        num_threads ... no. BLAS/OpenMP/torch threads per job with nj > 1, None is
+            cpu_count//nj (default:int = None)
+        **kwargs ... optional args. of feat.compute_<feat_type>()
+    """
+    utils.validate_data(data_dir,no_feats=True)
+    if not hasattr(feat, f'compute_{feat_type}'):
+        print(f'Error: unknown feature type {feat_type}.')
+        exit(1)
+    if not path.isdir(feat_dir):
+        os.mkdir(feat_dir)
+    wave_scp = io.read_scp(path.join(data_dir,'wave.scp'))
+    utt2seg_scp = path.join(data_dir,'utt2seg')
+
+    if path.isfile(utt2seg_scp):
+        print(f'{" ":3}Utt2seg file found, assuming waveforms are indexed by seg_id.')
+        utt2seg = io.read_scp(utt2seg_scp)
+    else:
+        print(f'{" ":3}No utt2seg file found, assuming waveforms are indexed by utt_id.')
+        utt2seg = None
+
+    # Split wave.scp into contiguous shards, one partial scp per shard
+    utt_ids = list(wave_scp.keys())
+    nj = max(1, min(nj, len(utt_ids)))
+    jobs = list()
+    for j in range(nj):
+        shard = {utt_id: wave_scp[utt_id] for utt_id in
+            utt_ids[j*len(utt_ids)//nj : (j+1)*len(utt_ids)//nj]}
+        shard_seg = None if utt2seg is None else {utt_id: utt2seg[utt_id] for utt_id in shard}
+        scp_file = path.join(feat_dir, f'{feat_type}_{path.basename(data_dir)}.{j+1}.scp')
+        jobs.append((shard, shard_seg, feat_dir, feat_type, scp_file, config, kwargs))
+    computed = sum(utils.run_parallel(_make_feats_shard, jobs, nj, num_threads))
+
+    # Merge partial scps
+    feats_dict = dict()
+    for job in jobs:
+        feats_dict.update(io.read_scp(job[4]))
+        os.remove(job[4])
+    io.write_scp(path.join(data_dir,f'{feat_type}.scp'), feats_dict)
+    print(f'{" ":3}Computed {computed} files, {len(feats_dict)-computed} were up to date.')
+
+def _make_feats_shard(wave_scp:dict, utt2seg:dict, feat_dir:str, feat_type:str,
+    scp_file:str, config:str=None, kwargs:dict=dict()) -> int:
+    """
+    Extract features for one shard of wave.scp and write its partial scp.
+    Return the no. computed files.
+    """
+    compute = getattr(feat, f'compute_{feat_type}')
+    conf = getattr(opts, feat_type.capitalize())(config, **kwargs).as_kwargs()
+    (feats_dict, computed) = dict(), 0
+    for utt_id, item in wave_scp.items():
+        stat = os.stat(item['file'])
+        segments = {utt_id: None} if utt2seg is None else utt2seg[utt_id]
+        todo = dict()
+        for seg_id, seg in segments.items():
+            file = path.join(feat_dir, f'{seg_id}.{feat_type}.npy')
+            feats_dict[seg_id] = file
+            fingerprint = _fingerprint(item['file'], stat, seg, feat_type, conf)
+            if not _is_up_to_date(file, fingerprint):
+                todo[seg_id] = (file, fingerprint)
+        if not todo:
+            continue
+
+        wave = io.read_npy(item['file'], mmap=utt2seg is not None)
+        if utt2seg is None:
+            seg_waves = [(utt_id, wave)]
+        else:
+            seg_waves = utils.segment_wave(wave, item['fs'], {seg_id: segments[seg_id] for seg_id in todo})
+        for (seg_id, seg_wave) in seg_waves:
+            (file, fingerprint) = todo[seg_id]
+            manifest = file[:-len('.npy')] + '.manifest'
+            if path.isfile(manifest):
+                os.remove(manifest)
+            io.write_npy(file, compute(seg_wave, config, **kwargs))
+            io.write_scp(manifest, {'wave': item['file'], 'fingerprint': fingerprint})
+            computed += 1
+    io.write_scp(scp_file, feats_dict)
+    return computed
+
+def _fingerprint(wave_file:str, stat, segment:dict, feat_type:str, conf:dict) -> str:
+    """
+    Hash the wave path, size and modification time, the segment and the options.
+    The wave is not read, so this is cheap.
+    """
+    key = {'wave': wave_file, 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+        'segment': segment, 'feat_type': feat_type, 'opts': conf}
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+def _is_up_to_date(file:str, fingerprint:str) -> bool:
+    """
+    Return True if the feature file exists and its manifest matches the fingerprint.
+    """
+    manifest = file[:-len('.npy')] + '.manifest'
+    if not path.isfile(file) or not path.isfile(manifest):
+        return False
+    return io.read_scp(manifest).get('fingerprint') == fingerprint
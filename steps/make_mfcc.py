@@ -2,12 +2,11 @@
 Made by Michal Borsky, 2019, copyright (C) RU
 Collection of high-level routines used to built whole projects.
 """
-import os
-from os import path
 import sleepat
-from sleepat import io, utils, feat
+from sleepat import steps
 
-def make_mfcc(data_dir:str, feat_dir:str, config:str=None, **kwargs) -> None:
+def make_mfcc(data_dir:str, feat_dir:str, config:str=None, nj:int=1,
+    num_threads:int=None, **kwargs) -> None:
     """
     Extract mel-frequency cepstral coefficients. Script assumes existence
     of wave.scp in data_dir.
@@ -23,35 +22,10 @@ def make_mfcc(data_dir:str, feat_dir:str, config:str=None, **kwargs) -> None:
         <fmax> ... maximum frequency (default: float = fs/2)
         <nceps> ... num. of cepstral coefficients including 0th (default:int = 13)
         config .... config file to pass optional args. <> (default:str=None)
+        nj ... no. parallel jobs, see make_feats() (default:int = 1)
+        num_threads ... no. threads per job with nj > 1, see make_feats() (default:int = None)
         **kwargs ... optional args. <>
     """
     print(f'Computing MFCC features for {data_dir}.')
-    utils.validate_data(data_dir,no_feats=True)
-
-    if not path.isdir(feat_dir):
-        os.mkdir(feat_dir)
-    wave_scp = io.read_scp(path.join(data_dir,'wave.scp'))
-    utt2seg_scp = path.join(data_dir,'utt2seg')
-    feats_dict = dict()
-
-    # Main part
-    if path.isfile(utt2seg_scp):
-        print(f'Utt2seg file found, assuming waveforms are indexed by seg_id.')
-        utt2seg = io.read_scp(utt2seg_scp)
-        for utt_id, item in wave_scp.items():
-            wave = io.read_npy(item['file'])
-            for (seg_id, seg_wave) in utils.segment_wave(wave, item['fs'], utt2seg[utt_id]):
-                file = path.join(feat_dir, f'{seg_id}.mfcc.npy')
-                mfcc = feat.compute_mfcc(seg_wave, config, **kwargs)
-                io.write_npy(file, mfcc)
-                feats_dict[seg_id] = file
-    else:
-        print(f'No utt2seg file found, assuming waveforms are indexed by utt_id.')
-        for utt_id, item in wave_scp.items():
-            wave = io.read_npy(item['file'])
-            file = path.join(feat_dir, f'{utt_id}.mfcc.npy')
-            mfcc = feat.compute_mfcc(wave, config, **kwargs)
-            io.write_npy(file, mfcc)
-            feats_dict[utt_id] = file
-    io.write_scp(path.join(data_dir,'mfcc.scp'), feats_dict)
+    steps.make_feats(data_dir, feat_dir, 'mfcc', config, nj, num_threads, **kwargs)
     print(f'MFCC extraction done.') 
@@ -12,7 +12,8 @@ def segment_data(data_dir:str, config:str=None, **kwargs) -> None:
     Segment files in the data directory according to the rec2seg file. This means
     splitting/changing files and changing rec_ids to match. Often, we dont want
     to segment waveforms and dump them on disk, but do it on the fly during
-    feature extraction, so we just copy wave.scp/rec2seg. The files that will be 
+    feature extraction, so we just copy wave.scp/rec2seg. Otherwise, waveforms are
+    opened memory-mapped and segments are written as they are sliced. The files that will be 
     modified are rec2sub, sub2rec, annot, periods.
 
     Input:
@@ -52,7 +53,7 @@ def segment_data(data_dir:str, config:str=None, **kwargs) -> None:
         for rec_id in rec2sub.keys():
             fs = waves[rec_id]['fs']
             wave_fid = waves[rec_id]['file']
-            wave = io.read_npy(wave_fid)
+            wave = io.read_npy(wave_fid, mmap=True)
             audio_dir = path.dirname(path.abspath(wave_fid))
             for (seg_id, seg_wave) in utils.segment_wave(wave, fs, rec2seg[rec_id]):
                 file = path.join(audio_dir, f'{seg_id}.npy')
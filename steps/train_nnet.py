@@ -51,9 +51,12 @@ def train_nnet(train_data:str, dev_data:str, lang_dir:str, exp_dir:str, config_m
         print(f'Error: number of events < 2 ({events_num}).')
         exit(1)
 
+    # Chunked sequence datasets take chunk length from the model
+    conf_mdl = getattr(opts,conf.model)(config_mdl)
+    kwargs = {'seq_len':conf_mdl.seq_len} if hasattr(conf_mdl,'seq_len') else dict()
     dataset = getattr(nnet,conf.dataset)
-    trainload = dataset(train_data,config=config_ds, mode='train').to_dataloader()
-    devload = dataset(dev_data,config=config_ds, mode='train').to_dataloader()
+    trainload = dataset(train_data,config=config_ds, mode='train', **kwargs).to_dataloader()
+    devload = dataset(dev_data,config=config_ds, mode='train', **kwargs).to_dataloader()
     sample_dim = trainload.dataset.sample_dim
 
     # Train the model
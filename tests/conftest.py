@@ -0,0 +1,50 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+
+Shared fixtures. A tiny data directory with the files every dataset expects,
+features are random, so tests compare code paths with each other.
+"""
+from os import path
+import numpy as np
+import pytest
+import sleepat
+from sleepat import io, utils
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """
+    Data directory with 4 utterances of 2 speakers, 13-dim features and
+    binary (T,1) targets. Waveforms are 3 seconds of int16 noise at 8kHz.
+    """
+    rng = np.random.default_rng(0)
+    data_dir = str(tmp_path / 'data')
+    (feats_scp, targets_scp, wave_scp, utt2spk) = dict(), dict(), dict(), dict()
+    tmp_path.joinpath('data').mkdir()
+    for i, num in enumerate([57, 83, 40, 121]):
+        utt_id = f'rec{i:02}'
+        feats_scp[utt_id] = path.join(data_dir, f'{utt_id}.feats.npy')
+        targets_scp[utt_id] = path.join(data_dir, f'{utt_id}.targets.npy')
+        wave_scp[utt_id] = {'file': path.join(data_dir, f'{utt_id}.wav.npy'), 'fs': 8000}
+        utt2spk[utt_id] = f'sub{i%2}'
+        io.write_npy(feats_scp[utt_id], rng.standard_normal((num,13)))
+        io.write_npy(targets_scp[utt_id], rng.integers(0, 2, (num,1)), dtype='int32')
+        io.write_npy(wave_scp[utt_id]['file'], rng.standard_normal(3*8000)*3000, dtype='int16')
+
+    mvn_scp = dict()
+    for spk_id in set(utt2spk.values()):
+        mvn_scp[spk_id] = path.join(data_dir, f'{spk_id}.mvn.npy')
+        io.write_npy(mvn_scp[spk_id], np.stack([np.zeros(13), np.ones(13)]))
+
+    io.write_scp(path.join(data_dir,'feats.scp'), feats_scp)
+    io.write_scp(path.join(data_dir,'targets.scp'), targets_scp)
+    io.write_scp(path.join(data_dir,'wave.scp'), wave_scp)
+    io.write_scp(path.join(data_dir,'mvn.scp'), mvn_scp)
+    io.write_scp(path.join(data_dir,'utt2spk'), utt2spk)
+    io.write_scp(path.join(data_dir,'spk2utt'), utils.rec2sub_to_sub2rec(utt2spk))
+    io.write_scp(path.join(data_dir,'rec2sub'), utt2spk)
+    io.write_scp(path.join(data_dir,'sub2rec'), utils.rec2sub_to_sub2rec(utt2spk))
+    io.write_scp(path.join(data_dir,'annot'), {utt_id: [] for utt_id in utt2spk})
+    io.write_scp(path.join(data_dir,'periods'),
+        {utt_id: {'start': '2020/01/01T00:00:00.000000'} for utt_id in utt2spk})
+    io.write_scp(path.join(data_dir,'events'), {'null': 0, 'snore': 1})
+    return data_dir
@@ -0,0 +1,54 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import pytest
+import torch
+import sleepat
+from sleepat import nnet
+
+def test_lane_scheduling():
+    """
+    Sequences go to the lane with the least chunks, a lane keeps consecutive
+    chunks of a sequence in consecutive batches and only the first chunk resets.
+    """
+    sampler = nnet.ChunkSampler([40, 20, 35], lanes=2, seq_len=16)
+    assert list(sampler) == [
+        [(0, 0, 0, True), (1, 1, 0, True)],
+        [(0, 0, 16, False), (1, 1, 16, False)],
+        [(0, 0, 32, False), (1, 2, 0, True)],
+        [(1, 2, 16, False)],
+        [(1, 2, 32, False)]]
+
+def test_shuffle_keeps_chunk_order():
+    """
+    Shuffling changes the order of sequences, not the order of their chunks.
+    """
+    lengths = [40, 20, 35, 70, 5]
+    sampler = nnet.ChunkSampler(lengths, lanes=3, seq_len=16, shuffle=True,
+        generator=torch.Generator().manual_seed(0))
+    chunks = {idx: list() for idx in range(len(lengths))}
+    lanes = dict()
+    for batch in sampler:
+        assert len({lane for (lane, _, _, _) in batch}) == len(batch)
+        for (lane, idx, beg, reset) in batch:
+            assert lanes.setdefault(idx, lane) == lane
+            assert reset == (beg == 0)
+            chunks[idx].append(beg)
+    for idx, length in enumerate(lengths):
+        assert chunks[idx] == list(range(0, length, 16))
+
+def test_warmup_resets_every_chunk():
+    sampler = nnet.ChunkSampler([40], lanes=1, seq_len=16, warmup=4)
+    assert [batch[0][2:] for batch in sampler] == [(0, True), (12, True), (24, True)]
+    with pytest.raises(ValueError):
+        nnet.ChunkSampler([40], seq_len=16, warmup=16)
+
+def test_warmup_scores_every_frame_once(data_dir):
+    """
+    Warm-up frames shared with the previous chunk are not scored again.
+    """
+    kwargs = dict(mode='train', splice_frames=False, apply_pca=False, chunk_seqs=True,
+        seq_len=16, batch_size=3)
+    dataset = nnet.SeqDataset(data_dir, chunk_warmup=4, **kwargs)
+    scored = sum(int((batch['target'] != -100).sum()) for batch in dataset.to_dataloader())
+    assert scored == sum(dataset[idx]['target'].shape[0] for idx in range(len(dataset)))
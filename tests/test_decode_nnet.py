@@ -0,0 +1,91 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import sys
+from os import path
+import numpy as np
+import pytest
+import torch
+import sleepat
+from sleepat import io, nnet, utils
+
+# steps/__init__ exports the function under the module name
+decode = sys.modules['sleepat.steps.decode_nnet']
+
+def decode_posts(data_dir:str, exp_dir:str, post_dir:str, configs:dict, stream:bool) -> dict:
+    """
+    Decode data_dir with the model in exp_dir and return {utt_id: posteriors}.
+    """
+    config_dec = path.join(exp_dir, f'decode_{stream}.conf')
+    io.write_scp(config_dec, {'stream': stream, 'batch_size': 50})
+    (post_scp, _) = decode._decode_data(data_dir, data_dir, exp_dir, post_dir,
+        configs['mdl'], configs['ds'], None, config_dec)
+    return {utt_id: io.read_npy(file) for utt_id, file in post_scp.items()}
+
+def make_exp(data_dir:str, exp_dir:str, model:str, dataset:str) -> dict:
+    """
+    Save a randomly initialized model into exp_dir and return its config files.
+    """
+    configs = {'mdl': path.join(exp_dir, 'mdl.conf'), 'ds': path.join(exp_dir, 'ds.conf')}
+    io.write_scp(configs['mdl'], {'model': model})
+    io.write_scp(configs['ds'], {'dataset': dataset})
+    io.write_scp(path.join(exp_dir, 'device'), {'device': 'cpu'})
+
+    torch.manual_seed(0)
+    sample_dim = getattr(nnet, dataset)(data_dir, config=configs['ds'], mode='eval').sample_dim
+    mdl = getattr(nnet, model)(config=configs['mdl'], in_dim=sample_dim, out_dim=2)
+    torch.save({'epoch': 0, 'state_dict': mdl.state_dict()}, path.join(exp_dir, 'final.pth'))
+    return configs
+
+@pytest.mark.parametrize('model, dataset', [('Dnn_2h', 'SimpleDataset'), ('Lstm_2h', 'SeqDataset')])
+def test_stream_matches_batch(data_dir, tmp_path, monkeypatch, model, dataset):
+    """
+    Stream mode decodes one utterance at a time, the posteriors must be the same
+    as from the whole-dataset pass. Batches are composed differently, so float32
+    matrix products may round differently in the last bit.
+    """
+    monkeypatch.setattr(utils, 'targets_to_scoring', lambda pred, post, events, config, tstamp: None)
+    exp_dir = str(tmp_path / 'exp')
+    tmp_path.joinpath('exp').mkdir()
+    configs = make_exp(data_dir, exp_dir, model, dataset)
+
+    batch = decode_posts(data_dir, exp_dir, exp_dir, configs, stream=False)
+    stream = decode_posts(data_dir, exp_dir, exp_dir, configs, stream=True)
+    assert list(batch) == list(stream)
+    for utt_id in batch:
+        np.testing.assert_allclose(stream[utt_id], batch[utt_id], rtol=1e-6, atol=1e-7)
+
+def test_parallel_split_recreated(data_dir, tmp_path, monkeypatch):
+    """
+    Shards left in decode_dir/split<nj> by an older run are removed before
+    splitting, the merged post.scp follows the order of rec2sub.
+    """
+    monkeypatch.setattr(utils, 'targets_to_scoring', lambda pred, post, events, config, tstamp: None)
+    monkeypatch.setattr(sleepat.steps, 'score_detect', lambda data_dir, lang_dir, decode_dir: None)
+    exp_dir = str(tmp_path / 'exp')
+    tmp_path.joinpath('exp').mkdir()
+    configs = make_exp(data_dir, exp_dir, 'Dnn_2h', 'SimpleDataset')
+    config_dec = path.join(exp_dir, 'decode.conf')
+    io.write_scp(config_dec, {'nj': 2})
+
+    split_dir = tmp_path / 'exp' / f'decode_{path.basename(data_dir)}' / 'split2'
+    split_dir.joinpath('1').mkdir(parents=True)
+    split_dir.joinpath('3').mkdir()
+    stale = split_dir / '1' / 'rec2seg'
+    stale.write_text('stale')
+    decode.decode_nnet(data_dir, data_dir, exp_dir, configs['mdl'], configs['ds'], None, config_dec)
+    assert not stale.exists()
+    assert sorted(p.name for p in split_dir.iterdir()) == ['1', '2']
+    post_scp = io.read_scp(str(split_dir.parent / 'post.scp'))
+    assert list(post_scp) == list(io.read_scp(path.join(data_dir, 'rec2sub')))
+
+def test_merge_rejects_unknown_utts(data_dir, tmp_path, monkeypatch):
+    """
+    Decoded utterances that are not in rec2sub are an error, not appended at the end.
+    """
+    monkeypatch.setattr(decode, '_decode_data', lambda *args: ({'unknown': 'x.npy'}, {'unknown': []}))
+    exp_dir = str(tmp_path / 'exp')
+    tmp_path.joinpath('exp').mkdir()
+    configs = make_exp(data_dir, exp_dir, 'Dnn_2h', 'SimpleDataset')
+    with pytest.raises(ValueError):
+        decode.decode_nnet(data_dir, data_dir, exp_dir, configs['mdl'], configs['ds'])
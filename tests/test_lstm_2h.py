@@ -0,0 +1,43 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import torch
+import sleepat
+from sleepat import nnet
+
+SEQ_OPTS = dict(mode='train', splice_frames=False, apply_pca=False, apply_mvn=False)
+
+def test_chunked_matches_full_sequence(data_dir):
+    """
+    Chunks without overlap processed with carried lane state give the same
+    outputs as the whole sequence in one forward pass.
+    """
+    torch.manual_seed(0)
+    full = nnet.SeqDataset(data_dir, **SEQ_OPTS)
+    chunked = nnet.SeqDataset(data_dir, chunk_seqs=True, seq_len=16, batch_size=3, **SEQ_OPTS)
+    mdl = nnet.Lstm_2h(in_dim=full.sample_dim, out_dim=2, hid_dim=8)
+    mdl.eval()
+
+    outputs = {idx: list() for idx in range(len(chunked))}
+    with torch.no_grad():
+        for batch in chunked.to_dataloader():
+            mdl.carry_state(batch['lane'], batch['reset'])
+            output = mdl(batch['sample']).reshape(batch['sample'].shape[0], -1, 2)
+            for (k, idx) in enumerate(batch['index'].tolist()):
+                outputs[idx].append(output[k][batch['target'][k].reshape(-1) != -100])
+        for idx in range(len(full)):
+            reference = mdl(full[idx]['sample'][None])
+            assert torch.allclose(torch.cat(outputs[idx]), reference, atol=1e-5)
+
+def test_packed_matches_single_sequence(data_dir):
+    """
+    A packed batch of sequences gives the same outputs as every sequence alone.
+    """
+    torch.manual_seed(0)
+    dataset = nnet.SeqDataset(data_dir, pack_seqs=True, batch_size=3, bucket_size=2, **SEQ_OPTS)
+    mdl = nnet.Lstm_2h(in_dim=dataset.sample_dim, out_dim=2, hid_dim=8)
+    mdl.eval()
+    with torch.no_grad():
+        for batch in dataset.to_dataloader():
+            reference = torch.cat([mdl(dataset[int(idx)]['sample'][None]) for idx in batch['index']])
+            assert torch.allclose(mdl(batch['sample']), reference, atol=1e-6)
@@ -0,0 +1,60 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import numpy as np
+import pytest
+import torch
+import sleepat
+from sleepat import nnet
+
+def test_store_kept_when_loading_opts_change(data_dir):
+    """
+    Options that only change how data is loaded keep the store, options
+    that change the samples invalidate it.
+    """
+    kwargs = dict(mode='train', use_store=True)
+    fingerprint = nnet.SimpleDataset(data_dir, **kwargs).store.fingerprint
+
+    dataset = nnet.SimpleDataset(data_dir, batch_fetch=True, store_dir=None, **kwargs)
+    assert dataset.store.fingerprint == fingerprint
+    assert dataset.store.is_built()
+    dataset = nnet.SimpleDataset(data_dir, splice_left=1, **kwargs)
+    assert dataset.store.fingerprint != fingerprint
+
+def test_store_round_trip(tmp_path):
+    """
+    Arrays and meta written into a store are read back unchanged, and the
+    store is only valid for the fingerprint it was built with.
+    """
+    store_dir = str(tmp_path / 'store')
+    store = nnet.SampleStore(store_dir, 'abc')
+    assert not store.is_built()
+    samples = store.create('samples', (5,3), np.float32)
+    samples[:] = np.arange(15).reshape(5,3)
+    store.commit({'sample_size': 5})
+
+    store = nnet.SampleStore(store_dir, 'abc')
+    assert store.is_built()
+    assert store.read_meta() == {'sample_size': 5}
+    np.testing.assert_array_equal(store.open('samples'), np.arange(15).reshape(5,3))
+    assert not nnet.SampleStore(store_dir, 'xyz').is_built()
+
+@pytest.mark.parametrize('dataset, kwargs', [
+    ('SimpleDataset', dict(lazy_splice=False)),
+    ('SimpleDataset', dict(lazy_splice=True)),
+    ('ConvDataset', dict()),
+    ('SeqDataset', dict(apply_pca=False))])
+def test_dataset_from_store(data_dir, dataset, kwargs):
+    """
+    A dataset loaded from the store gives the same items as one built in memory.
+    """
+    kwargs = dict(mode='train', **kwargs)
+    memory = getattr(nnet, dataset)(data_dir, **kwargs)
+    getattr(nnet, dataset)(data_dir, use_store=True, **kwargs)
+    stored = getattr(nnet, dataset)(data_dir, use_store=True, **kwargs)
+    assert stored.store.is_built()
+    assert len(memory) == len(stored)
+    for idx in range(len(memory)):
+        (a, b) = (memory[idx], stored[idx])
+        assert torch.equal(a['sample'], b['sample'])
+        assert torch.equal(torch.as_tensor(a['target']), torch.as_tensor(b['target']))
@@ -0,0 +1,45 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+import pytest
+import torch
+import sleepat
+from sleepat import nnet
+
+def fetch_all(dataset) -> list:
+    """
+    Return all batches of a sequential dataloader.
+    """
+    return list(dataset.to_dataloader())
+
+def assert_same(batches_a:list, batches_b:list):
+    assert len(batches_a) == len(batches_b)
+    for (a, b) in zip(batches_a, batches_b):
+        assert torch.equal(a['sample'], b['sample'])
+        assert torch.equal(a['target'], b['target'])
+
+@pytest.mark.parametrize('splice_frames', [True, False])
+def test_lazy_splice_matches_eager(data_dir, splice_frames):
+    """
+    Lazy splicing gathers spliced samples on fetch, the result must be identical
+    to splicing everything upfront. Without splicing, lazy_splice has no effect.
+    """
+    kwargs = dict(mode='train', batch_size=32, splice_frames=splice_frames)
+    eager = nnet.SimpleDataset(data_dir, lazy_splice=False, **kwargs)
+    lazy = nnet.SimpleDataset(data_dir, lazy_splice=True, **kwargs)
+    assert len(eager) == len(lazy)
+    assert eager.sample_dim == lazy.sample_dim
+    assert_same(fetch_all(eager), fetch_all(lazy))
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_batch_fetch_matches_collate(data_dir, shuffle):
+    """
+    Fetching whole batches by one __getitem__ call gives the same batches as
+    collating single frames, including the shuffled order for the same seed.
+    """
+    kwargs = dict(mode='train', batch_size=32, shuffle=shuffle)
+    torch.manual_seed(0)
+    batches = fetch_all(nnet.SimpleDataset(data_dir, **kwargs))
+    torch.manual_seed(0)
+    fetched = fetch_all(nnet.SimpleDataset(data_dir, batch_fetch=True, **kwargs))
+    assert_same(batches, fetched)
@@ -0,0 +1,27 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+"""
+from os import path
+import torch
+import sleepat
+from sleepat import io, nnet
+
+def test_train_stats(data_dir, tmp_path):
+    """
+    Every epoch writes its stats, samples are counted once per target frame and
+    peak RSS is reported for the main process only.
+    """
+    torch.manual_seed(0)
+    dataset = nnet.SimpleDataset(data_dir, mode='train', batch_size=32, num_workers=0)
+    mdl = nnet.Dnn_2h(in_dim=dataset.sample_dim, out_dim=2)
+    exp_dir = str(tmp_path)
+    nnet.train_torch(mdl, dataset.to_dataloader(), dataset.to_dataloader(), exp_dir,
+        max_epochs=2, save_epochs=[2], lr=0.1)
+
+    stats = io.read_scp(path.join(exp_dir, 'train_stats'))
+    assert sorted(stats) == ['1', '2']
+    for epoch in stats.values():
+        assert epoch['train']['samples'] == len(dataset)
+        assert epoch['peak_rss_mb'] > 0
+        assert 'peak_rss_workers_mb' not in epoch
+    assert path.islink(path.join(exp_dir, 'final.pth'))
@@ -12,8 +12,10 @@ from .rec2sub_to_sub2rec import rec2sub_to_sub2rec
 from .seg2rec_to_rec2seg import seg2rec_to_rec2seg
 from .segment_periods import segment_periods
 from .segment_scoring import segment_scoring
+from .run_parallel import run_parallel
 from .segment_wave import segment_wave
 from .setup_workdir import setup_workdir
+from .split_data_per_job import split_data_per_job
 from .split_data_per_recording import split_data_per_recording
 from .split_data_per_subject import split_data_per_subject
 from .sub2rec_to_rec2sub import sub2rec_to_rec2sub
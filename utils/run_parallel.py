@@ -0,0 +1,57 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Collection of utility routines to manipulate datasets, do checks.
+Some functions are generators and have return in loop.
+"""
+import os
+import multiprocessing
+
+THREAD_VARS = ['OMP_NUM_THREADS','MKL_NUM_THREADS','OPENBLAS_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS','VECLIB_MAXIMUM_THREADS']
+
+def run_parallel(func, jobs:list, nj:int=1, num_threads:int=None) -> list:
+    """
+    Run func(*job) for every job in a pool of nj worker processes and return
+    the results in the order of jobs, regardless of which worker finished first.
+    Every worker is limited to num_threads BLAS/OpenMP/torch threads, so nj workers
+    do not oversubscribe the cores. With nj=1 the jobs run in the calling process
+    and num_threads is ignored, the caller's thread settings are not changed.
+    Processes are forked where possible, so recipes without a __main__ guard
+    are not re-executed by the workers. func must be a module-level function.
+    Input:
+        func ... a module-level function
+        jobs ... a list of argument tuples, one per job
+        nj ... no. worker processes (default:int = 1)
+        num_threads ... no. threads per worker, None is cpu_count//nj (default:int = None)
+    Output:
+        results ... a list of func outputs in the order of jobs
+    """
+    if nj < 1:
+        raise ValueError('No. jobs must be a positive integer.')
+    nj = min(nj, len(jobs))
+    if nj <= 1:
+        return [func(*job) for job in jobs]
+    if num_threads is None:
+        num_threads = max(1, (os.cpu_count() or 1)//nj)
+
+    # Workers inherit the environment, libraries read it when they start threads
+    environ = {var: os.environ.get(var) for var in THREAD_VARS}
+    os.environ.update({var: str(num_threads) for var in THREAD_VARS})
+    method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    try:
+        ctx = multiprocessing.get_context(method)
+        with ctx.Pool(nj, initializer=_init_worker, initargs=(num_threads,)) as pool:
+            return pool.starmap(func, jobs, chunksize=1)
+    finally:
+        for var, value in environ.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+def _init_worker(num_threads:int) -> None:
+    """
+    Limit intra-op threads of libraries already loaded in a forked worker.
+    """
+    import torch
+    torch.set_num_threads(num_threads)
@@ -0,0 +1,86 @@
+"""
+Made by Michal Borsky, 2019, copyright (C) RU
+Collection of high-level routines used to built whole projects.
+"""
+import os
+from os import path
+import sleepat
+from sleepat import io, utils
+
+
+def split_data_per_job(data_dir:str, dst_dir:str, nj:int=1) -> list:
+    """
+    Splits the dataset into nj shards for parallel processing. The split is done
+    per recording, i.e., all segments of a recording end up in the same shard,
+    and it is deterministic, shard j holds the j-th contiguous block of recordings
+    in the order of rec2sub. If rec2seg exists, recordings are its keys and
+    utterances are segments, otherwise every utterance is a recording. The shards
+    go into dst_dir/1 ... dst_dir/nj, empty shards are not created.
+
+    Input:
+        data_dir ... directory that contains rec2sub and other files to split
+        dst_dir ... output directory
+        <nj> ... no. shards (default:int = 1)
+    Output:
+        shard_dirs ... a list of shard directories
+    """
+    print(f'Splitting {data_dir} into {nj} jobs.')
+
+    ## Config section
+    files_to_split = ['rec2sub','annot','periods','feats.scp','targets.scp','utt2spk']
+    rec2sub = io.read_scp(path.join(data_dir,'rec2sub'))
+    if not rec2sub:
+        print('Error: empty rec2sub file.')
+        exit(1)
+
+    ## Group utterances per recording, keep rec2sub order
+    rec2seg_file = path.join(data_dir,'rec2seg')
+    if path.exists(rec2seg_file):
+        rec2seg = io.read_scp(rec2seg_file)
+        wave = io.read_scp(path.join(data_dir,'wave.scp'))
+        seg2rec = {seg_id: rec_id for rec_id, segs in rec2seg.items() for seg_id in segs}
+        groups = dict()
+        for utt_id in rec2sub:
+            groups.setdefault(seg2rec[utt_id], list()).append(utt_id)
+    else:
+        rec2seg = None
+        groups = {utt_id: [utt_id] for utt_id in rec2sub}
+        files_to_split.append('wave.scp')
+
+    ## Split recordings into contiguous blocks
+    rec_list = list(groups.keys())
+    nj = max(1, min(nj, len(rec_list)))
+    shard_dirs = list()
+    for j in range(nj):
+        shard_recs = rec_list[j*len(rec_list)//nj : (j+1)*len(rec_list)//nj]
+        shard_utts = [utt_id for rec_id in shard_recs for utt_id in groups[rec_id]]
+        shard_dir = path.join(dst_dir,str(j+1))
+        if not path.exists(shard_dir):
+            os.makedirs(shard_dir)
+        shard_dirs.append(shard_dir)
+
+        if rec2seg is not None:
+            io.write_scp(path.join(shard_dir,'wave.scp'), {rec: wave[rec] for rec in shard_recs})
+            io.write_scp(path.join(shard_dir,'rec2seg'),
+                {rec: {seg: rec2seg[rec][seg] for seg in groups[rec]} for rec in shard_recs})
+
+        for file in files_to_split:
+            if not path.exists(path.join(data_dir,file)):
+                continue
+            scp = io.read_scp(path.join(data_dir,file))
+            subset_scp = {utt: scp[utt] for utt in shard_utts}
+            io.write_scp(path.join(shard_dir,file),subset_scp)
+            if file == 'rec2sub':
+                io.write_scp(path.join(shard_dir,'sub2rec'),utils.rec2sub_to_sub2rec(subset_scp))
+            if file == 'utt2spk':
+                io.write_scp(path.join(shard_dir,'spk2utt'),utils.rec2sub_to_sub2rec(subset_scp))
+
+        ## Speaker-level files
+        mvn_file = path.join(data_dir,'mvn.scp')
+        if path.exists(mvn_file):
+            mvn = io.read_scp(mvn_file)
+            spks = set(io.read_scp(path.join(shard_dir,'utt2spk')).values()) \
+                if path.exists(path.join(shard_dir,'utt2spk')) else set(mvn)
+            io.write_scp(path.join(shard_dir,'mvn.scp'),
+                {spk: item for spk, item in mvn.items() if spk in spks})
+    return shard_dirs